@@ -1,23 +1,45 @@
-import pandas as pd
-from transformers import pipeline
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from tqdm import tqdm
-import torch
 import warnings
+import model_registry
+from bart_summarizer import MODEL_NAME, BatchSummarizer, load_pipeline
+from long_text import MapReduceSummarizer
+from summary_cache import SummaryCache, needs_summary
+from summary_job import SummaryJob
+from job_panel import JobPanel
+from decoding import DEFAULT_PROFILE, PROFILES, generation_params
+from checkpoint import JobCheckpoint
+from dedup import DEFAULT_THRESHOLD, METHODS, Deduplicator
+from excel_io import INPUT_FILETYPES, OUTPUT_FILETYPES, workbook_columns
+from selection_dialog import SelectionDialog, describe
+from router import CostRouter, default_route_words
 warnings.filterwarnings('ignore')
 
 class BookSummarizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Book Preface Summarizer")
-        self.root.geometry("500x400")
+        self.root.geometry("500x790")
         
         # Variables
         self.file_path = tk.StringVar()
         self.column_name = tk.StringVar()
+        self.selection = None
+        self.selection_text = tk.StringVar()
+        self.sheets_columns = {}
         self.min_words = tk.IntVar(value=100)
         self.max_words = tk.IntVar(value=200)
+        self.batch_size = tk.IntVar(value=8)
+        self.runtime = tk.StringVar(value="torch")
+        self.profile = tk.StringVar(value=DEFAULT_PROFILE)
+        self.force_refresh = tk.BooleanVar(value=False)
+        self.long_documents = tk.BooleanVar(value=False)
+        self.route_texts = tk.BooleanVar(value=False)
+        self.route_words = tk.IntVar(value=default_route_words(self.max_words.get()))
+        self.dedup_method = tk.StringVar(value="exact")
+        self.similarity = tk.DoubleVar(value=DEFAULT_THRESHOLD)
+        self.batcher = None
+        self.batcher_runtime = None
         
         # GUI Elements
         self.create_widgets()
@@ -42,6 +64,13 @@ class BookSummarizerApp:
         self.column_dropdown = ttk.Combobox(self.root, textvariable=self.column_name, state="readonly")
         self.column_dropdown.pack()
         
+        # Several sheets and columns in one run (replaces the column above)
+        selection_frame = tk.Frame(self.root)
+        selection_frame.pack(pady=5)
+        tk.Button(selection_frame, text="Sheets/columns...", command=self.choose_selection).pack(side=tk.LEFT)
+        tk.Label(selection_frame, textvariable=self.selection_text, fg="gray25").pack(side=tk.LEFT, padx=5)
+        self.column_dropdown.bind("<<ComboboxSelected>>", lambda event: self.set_selection(None))
+        
         # Summary Length Settings
         tk.Label(self.root, text="Summary Length (Words)", font=('Arial', 12, 'bold')).pack(pady=10)
         
@@ -51,90 +80,199 @@ class BookSummarizerApp:
         tk.Label(self.root, text="Max Words:").pack()
         tk.Entry(self.root, textvariable=self.max_words).pack()
         
+        tk.Label(self.root, text="Batch Size:").pack()
+        tk.Entry(self.root, textvariable=self.batch_size).pack()
+        
+        # int8 and onnx are faster on machines without a GPU, at a small quality cost
+        tk.Label(self.root, text="Runtime:").pack()
+        ttk.Combobox(self.root, textvariable=self.runtime, values=model_registry.RUNTIMES,
+                     state="readonly", width=8).pack()
+        
+        # Decoding profile: fast (greedy), balanced (2 beams) or quality (4 beams)
+        tk.Label(self.root, text="Decoding:").pack()
+        ttk.Combobox(self.root, textvariable=self.profile, values=list(PROFILES),
+                     state="readonly", width=8).pack()
+        
+        # Repeated texts are summarized once; minhash/embedding also catch near duplicates
+        dedup_frame = tk.Frame(self.root)
+        dedup_frame.pack(pady=(5, 0))
+        tk.Label(dedup_frame, text="Duplicates:").pack(side=tk.LEFT)
+        ttk.Combobox(dedup_frame, textvariable=self.dedup_method, values=METHODS,
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        tk.Label(dedup_frame, text="Similarity:").pack(side=tk.LEFT)
+        tk.Entry(dedup_frame, textvariable=self.similarity, width=5).pack(side=tk.LEFT, padx=5)
+        
+        tk.Checkbutton(self.root, text="Force refresh (ignore cached summaries)",
+                       variable=self.force_refresh).pack(pady=5)
+        tk.Checkbutton(self.root, text="Summarize long documents in full (map-reduce)",
+                       variable=self.long_documents).pack()
+        # Short, plain texts get an extractive summary instead of a BART call
+        route_frame = tk.Frame(self.root)
+        route_frame.pack()
+        tk.Checkbutton(route_frame, text="Extractive summary for texts up to",
+                       variable=self.route_texts).pack(side=tk.LEFT)
+        tk.Entry(route_frame, textvariable=self.route_words, width=5).pack(side=tk.LEFT)
+        tk.Label(route_frame, text="words").pack(side=tk.LEFT, padx=5)
+        
         # Process Button
-        tk.Button(
+        self.process_button = tk.Button(
             self.root,
             text="Generate Summaries",
             command=self.process_file,
             bg="#2196F3",
             fg="white",
             font=('Arial', 10, 'bold')
-        ).pack(pady=20)
+        )
+        self.process_button.pack(pady=(20, 5))
+        
+        # Progress, Pause and Cancel for the running job
+        self.job_panel = JobPanel(self.root)
+        self.job_panel.pack()
         
         # Status Label
-        self.status_label = tk.Label(self.root, text="", fg="green")
+        self.status_label = tk.Label(self.root, text="", fg="green", wraplength=450)
         self.status_label.pack()
     
     def browse_file(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xls")])
+        file_path = filedialog.askopenfilename(filetypes=INPUT_FILETYPES)
         if file_path:
             self.file_path.set(file_path)
             self.load_columns(file_path)
+            # Start loading the model while the user picks a column
+            runtime = self.runtime.get()
+            if not model_registry.is_loaded(model_registry.model_key("pipeline", MODEL_NAME, runtime)):
+                model_registry.warm_up("bart", runtime=runtime)
     
     def load_columns(self, file_path):
         try:
-            df = pd.read_excel(file_path)
-            self.column_dropdown['values'] = df.columns.tolist()
-            if len(df.columns) > 0:
-                self.column_name.set(df.columns[0])
+            self.sheets_columns = workbook_columns(file_path)
+            columns = next(iter(self.sheets_columns.values()), [])
+            self.column_dropdown['values'] = columns
+            if len(columns) > 0:
+                self.column_name.set(columns[0])
+            self.set_selection(None)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read file: {e}")
     
+    def choose_selection(self):
+        if not self.sheets_columns:
+            messagebox.showerror("Error", "Please select an Excel file first!")
+            return
+        dialog = SelectionDialog(self.root, self.sheets_columns, self.selection)
+        if dialog.selection is not None:
+            self.set_selection(dialog.selection)
+    
+    def set_selection(self, selection):
+        self.selection = selection
+        self.selection_text.set(describe(selection) if selection else "")
+    
     def process_file(self):
+        if self.job_panel.running:
+            return
+        
         if not self.file_path.get():
             messagebox.showerror("Error", "Please select an Excel file first!")
             return
         
-        if not self.column_name.get():
+        if not self.column_name.get() and not self.selection:
             messagebox.showerror("Error", "Please select a column!")
             return
         
+        # Ask for the output first: results are written as each chunk finishes
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=OUTPUT_FILETYPES
+        )
+        if not output_path:
+            return
+        
+        # Resume from the journal of an interrupted run on the same output
+        checkpoint = JobCheckpoint(output_path)
+        if checkpoint.exists() and not messagebox.askyesno(
+                "Resume", "An unfinished run was found for this output file. Resume it?"):
+            checkpoint.discard()
+        
         try:
-            # Initialize summarizer
-            self.status_label.config(text="Loading model... (this may take a minute)", fg="blue")
-            self.root.update()
-            
-            summarizer = pipeline(
-                "summarization",
-                model="facebook/bart-large-cnn",
-                device=0 if torch.cuda.is_available() else -1,
-                truncation=True
-            )
+            # Rows already summarized with the same settings come from the cache
+            cache = SummaryCache(force_refresh=self.force_refresh.get())
+            # Read settings here: Tk variables must not be touched from the worker thread
+            max_length, min_length = self.max_words.get(), self.min_words.get()
+            batch_size = max(1, self.batch_size.get())
+            long_documents = self.long_documents.get()
+            runtime = self.runtime.get()
+            profile = self.profile.get()
+            dedup = None if self.dedup_method.get() == "off" else Deduplicator(self.dedup_method.get(),
+                                                                                threshold=self.similarity.get())
+            params = BatchSummarizer.cache_params(max_length=max_length, min_length=min_length,
+                                                  runtime=runtime, profile=profile)
+            if long_documents:
+                params["long_documents"] = True
+            if self.batcher is not None and self.batcher_runtime != runtime:
+                self.batcher = None
+            if self.batcher is not None:
+                self.batcher.batch_size = batch_size
+                self.batcher.profile = profile
             
-            # Read Excel file
-            df = pd.read_excel(self.file_path.get())
+            def key_for(text):
+                return cache.key(text, "bart", MODEL_NAME, **params) if needs_summary(text) else None
             
-            # Summarize each entry
-            summaries = []
-            for text in tqdm(df[self.column_name.get()], desc="Summarizing"):
-                if pd.isna(text) or len(str(text).split()) < 10:
-                    summaries.append("")
-                    continue
+            def summarize_missing(missing_texts):
+                # Initialize summarizer only once some rows are not cached
+                if self.batcher is None:
+                    self.job_panel.status("Loading model... (this may take a minute)")
+                    self.batcher = BatchSummarizer(load_pipeline(runtime=runtime), batch_size=batch_size,
+                                                   profile=profile)
+                    self.batcher_runtime = runtime
                 
-                summary = summarizer(
-                    str(text),
-                    max_length=self.max_words.get(),
-                    min_length=self.min_words.get()
-                )[0]['summary_text']
-                summaries.append(summary)
-            
-            # Add summaries to DataFrame
-            df["Summary"] = summaries
+                # Long texts are split into windows and reduced instead of being truncated
+                if long_documents:
+                    long_summarizer = MapReduceSummarizer(self.batcher.tokenizer, self.batcher.summarize_all,
+                                                          cache=cache, cache_tag=dict(backend="bart", model=MODEL_NAME,
+                                                                                      **generation_params(profile),
+                                                                                      **model_registry.runtime_tag(runtime)))
+                    return long_summarizer.summarize_all(missing_texts, max_length=max_length, min_length=min_length)
+                
+                # Summarize all entries in length-sorted batches
+                return self.batcher.summarize_all(missing_texts, max_length=max_length, min_length=min_length)
             
-            # Save to new file
-            output_path = filedialog.asksaveasfilename(
-                defaultextension=".xlsx",
-                filetypes=[("Excel Files", "*.xlsx")]
-            )
+            # Easy rows skip the model (router.py)
+            router = None
+            if self.route_texts.get():
+                router = CostRouter(summary_words=max_length, route_words=self.route_words.get())
+                key_for = router.key_for(key_for)
+                summarize_missing = router.summarize(summarize_missing)
             
-            if output_path:
-                df.to_excel(output_path, index=False)
-                self.status_label.config(text="Summarization complete! File saved.", fg="green")
-                messagebox.showinfo("Success", "Summarized Excel file saved successfully!")
-        
+            job = SummaryJob(self.file_path.get(), self.column_name.get(), output_path,
+                             summarize_missing, key_for, cache=cache, checkpoint=checkpoint,
+                             summary_column="Summary", batch_rows=batch_size * 8, dedup=dedup,
+                             selection=self.selection)
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
             self.status_label.config(text="Error occurred!", fg="red")
+            return
+        
+        # Run on a worker thread so the window stays responsive
+        self.process_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Summarizing...", fg="blue")
+        self.job_panel.start(job, lambda job, error: self.job_finished(job, error, cache, router))
+    
+    def job_finished(self, job, error, cache, router=None):
+        cache.close()
+        self.process_button.config(state=tk.NORMAL)
+        if error is not None:
+            messagebox.showerror("Error", f"An error occurred: {error}")
+            self.status_label.config(text="Error occurred!", fg="red")
+        elif job.cancelled:
+            self.status_label.config(text=f"Cancelled: {job.rows_done} rows saved. Run again on the same file to resume.",
+                                     fg="orange")
+        else:
+            message = f"Summarization complete! File saved. {cache.stats()}"
+            if job.dedup is not None:
+                message += f" {job.dedup.stats()}"
+            if router is not None:
+                message += f" {router.stats()}"
+            self.status_label.config(text=message, fg="green")
+            messagebox.showinfo("Success", "Summarized Excel file saved successfully!")
 
 # Run the application
 if __name__ == "__main__":
@@ -1,98 +1,50 @@
-import pandas as pd
-import torch
+import multiprocessing
+import sys
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from tqdm import tqdm
-from transformers import pipeline, BartTokenizer, BartForConditionalGeneration
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from keybert import KeyBERT
-import numpy as np
 import warnings
+import model_registry
+from smart_summarizer import SmartSummarizer, ParallelSmartSummarizer
+from long_text import MapReduceSummarizer
+from summary_cache import SummaryCache, needs_summary
+from summary_job import SummaryJob
+from checkpoint import JobCheckpoint
+from dedup import DEFAULT_THRESHOLD, METHODS, Deduplicator
+from excel_io import INPUT_FILETYPES, OUTPUT_FILETYPES, workbook_columns
+from selection_dialog import SelectionDialog, describe
+from job_panel import JobPanel
+from decoding import DEFAULT_PROFILE, PROFILES, generation_params
+from instrumentation import Stats
+from router import CostRouter, default_route_words
 warnings.filterwarnings('ignore')
 
-class SmartSummarizer:
-    def __init__(self):
-        # INITIALIZE ALL MODELS
-        self.device = 0 if torch.cuda.is_available() else -1
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.keyword_model = KeyBERT()
-        self.tokenizer = BartTokenizer.from_pretrained('facebook/bart-large-cnn')
-        self.model = BartForConditionalGeneration.from_pretrained('facebook/bart-large-cnn').to(
-            torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        )
-
-    def extract_key_concepts(self, text):
-        #IDENTIFY CORE CONCEPTS USING KEYBERT
-        return [kw[0] for kw in 
-                self.keyword_model.extract_keywords(
-                    text,
-                    keyphrase_ngram_range=(1, 2),
-                    stop_words='english',
-                    top_n=5
-                )]
-
-    def select_relevant_sentences(self, text, concepts):
-        """Semantic filtering of important sentences"""
-        sentences = [s.strip() for s in text.split('. ') if len(s) > 10]
-        if len(sentences) < 3:
-            return text
-            
-        # ENCODE AND COMPARE
-        sentence_embeddings = self.sentence_model.encode(sentences)
-        concept_embeddings = self.sentence_model.encode(concepts)
-        similarity_scores = cosine_similarity(sentence_embeddings, concept_embeddings)
-        
-        # SELECT TOP 3 MOST RELEVANT SENTENCES
-        top_indices = np.argsort(np.max(similarity_scores, axis=1))[-3:][::-1]
-        return '. '.join([sentences[i] for i in top_indices if similarity_scores[i].max() > 0.3])
-
-    def generate_summary(self, text, max_length=200, min_length=100):
-        """End-to-end smart summarization"""
-        try:
-            if pd.isna(text) or len(str(text).strip()) < 50:
-                return ""
-                
-            text = str(text)
-            concepts = self.extract_key_concepts(text)
-            important_content = self.select_relevant_sentences(text, concepts) or text
-            
-            # GENERATE SUMMARY WITH PROPER PARAMETERES
-            inputs = self.tokenizer(
-                important_content,
-                max_length=1024,
-                truncation=True,
-                return_tensors="pt"
-            ).to(self.model.device)
-            
-            summary_ids = self.model.generate(
-                inputs['input_ids'],
-                num_beams=4,
-                length_penalty=2.0,
-                max_length=max_length,
-                min_length=min_length,
-                no_repeat_ngram_size=3,
-                early_stopping=True
-            )
-            
-            return self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-            
-        except Exception as e:
-            print(f"⚠️ Error processing one entry: {str(e)[:100]}...")
-            return "[SUMMARY FAILED]"
-
 class SmartSummarizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Smart Summarizer")
-        self.root.geometry("550x450")
+        self.root.geometry("550x735")
         
         # VARIABLES
         self.file_path = tk.StringVar()
         self.column_name = tk.StringVar()
+        self.selection = None
+        self.selection_text = tk.StringVar()
+        self.sheets_columns = {}
         self.min_words = tk.IntVar(value=100)
         self.max_words = tk.IntVar(value=200)
+        self.workers = tk.IntVar(value=1)
+        self.runtime = tk.StringVar(value="torch")
+        self.profile = tk.StringVar(value=DEFAULT_PROFILE)
+        self.force_refresh = tk.BooleanVar(value=False)
+        self.long_documents = tk.BooleanVar(value=False)
+        self.save_report = tk.BooleanVar(value=False)
+        self.route_texts = tk.BooleanVar(value=False)
+        self.route_words = tk.IntVar(value=default_route_words(self.max_words.get()))
+        self.dedup_method = tk.StringVar(value="exact")
+        self.similarity = tk.DoubleVar(value=DEFAULT_THRESHOLD)
         self.summarizer = None
+        # PER-STAGE TIMERS AND COUNTERS, ALWAYS COLLECTED (RESET AT THE START OF EACH RUN)
+        self.stats = Stats()
         
         # GUI ELEMENTS
         self.create_widgets()
@@ -128,6 +80,13 @@ class SmartSummarizerApp:
                                           state="readonly", width=50)
         self.column_dropdown.pack(pady=5)
         
+        # SEVERAL SHEETS AND COLUMNS IN ONE RUN (REPLACES THE COLUMN ABOVE)
+        selection_frame = tk.Frame(self.root)
+        selection_frame.pack()
+        tk.Button(selection_frame, text="Sheets/columns...", command=self.choose_selection).pack(side=tk.LEFT)
+        tk.Label(selection_frame, textvariable=self.selection_text, fg="gray25").pack(side=tk.LEFT, padx=5)
+        self.column_dropdown.bind("<<ComboboxSelected>>", lambda event: self.set_selection(None))
+        
         # SUMMARY LENGTH SETTINGS
         tk.Label(self.root, text="3. Set Summary Length", 
                font=('Arial', 10, 'bold')).pack(anchor='w', padx=20, pady=(10,0))
@@ -141,8 +100,45 @@ class SmartSummarizerApp:
         tk.Label(length_frame, text="Max Words:").grid(row=0, column=2, sticky='e')
         tk.Entry(length_frame, textvariable=self.max_words, width=5).grid(row=0, column=3, padx=5)
         
+        tk.Label(length_frame, text="Workers:").grid(row=0, column=4, sticky='e')
+        tk.Entry(length_frame, textvariable=self.workers, width=5).grid(row=0, column=5, padx=5)
+        
+        # CPU RUNTIME: INT8 AND ONNX TRADE A LITTLE QUALITY FOR SPEED ON MACHINES WITHOUT A GPU
+        runtime_frame = tk.Frame(self.root)
+        runtime_frame.pack(pady=(5,0))
+        tk.Label(runtime_frame, text="Runtime:").pack(side=tk.LEFT)
+        ttk.Combobox(runtime_frame, textvariable=self.runtime, values=model_registry.RUNTIMES,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        # DECODING PROFILE: FAST (GREEDY), BALANCED (2 BEAMS) OR QUALITY (4 BEAMS)
+        tk.Label(runtime_frame, text="Decoding:").pack(side=tk.LEFT, padx=(10,0))
+        ttk.Combobox(runtime_frame, textvariable=self.profile, values=list(PROFILES),
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        
+        # REPEATED TEXTS ARE SUMMARIZED ONCE; MINHASH/EMBEDDING ALSO CATCH NEAR DUPLICATES
+        dedup_frame = tk.Frame(self.root)
+        dedup_frame.pack(pady=(5,0))
+        tk.Label(dedup_frame, text="Duplicates:").pack(side=tk.LEFT)
+        ttk.Combobox(dedup_frame, textvariable=self.dedup_method, values=METHODS,
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        tk.Label(dedup_frame, text="Similarity:").pack(side=tk.LEFT, padx=(10,0))
+        tk.Entry(dedup_frame, textvariable=self.similarity, width=5).pack(side=tk.LEFT, padx=5)
+        
+        tk.Checkbutton(self.root, text="Force refresh (ignore cached summaries)",
+                       variable=self.force_refresh).pack(pady=(10,0))
+        tk.Checkbutton(self.root, text="Summarize long documents in full (map-reduce)",
+                       variable=self.long_documents).pack()
+        tk.Checkbutton(self.root, text="Save timing report next to the output file",
+                       variable=self.save_report).pack()
+        # SHORT, PLAIN TEXTS GET AN EXTRACTIVE SUMMARY INSTEAD OF THE FULL PIPELINE
+        route_frame = tk.Frame(self.root)
+        route_frame.pack()
+        tk.Checkbutton(route_frame, text="Extractive summary for texts up to",
+                       variable=self.route_texts).pack(side=tk.LEFT)
+        tk.Entry(route_frame, textvariable=self.route_words, width=5).pack(side=tk.LEFT)
+        tk.Label(route_frame, text="words").pack(side=tk.LEFT, padx=5)
+        
         # PROCESS BUTTON
-        tk.Button(
+        self.process_button = tk.Button(
             self.root,
             text="Generate Smart Summaries",
             command=self.process_file,
@@ -150,81 +146,191 @@ class SmartSummarizerApp:
             fg="white",
             font=('Arial', 10, 'bold'),
             pady=10
-        ).pack(pady=20, fill=tk.X, padx=50)
+        )
+        self.process_button.pack(pady=(20, 5), fill=tk.X, padx=50)
+        
+        # PROGRESS BAR, LIVE STATS AND PAUSE/CANCEL (THE JOB RUNS ON A WORKER THREAD)
+        self.job_panel = JobPanel(self.root)
+        self.job_panel.pack()
         
         # STATUS LABEL
-        self.status_label = tk.Label(self.root, text="", fg="green")
+        self.status_label = tk.Label(self.root, text="", fg="green", wraplength=500)
         self.status_label.pack()
     
     def browse_file(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xls")])
+        file_path = filedialog.askopenfilename(filetypes=INPUT_FILETYPES)
         if file_path:
             self.file_path.set(file_path)
             self.load_columns(file_path)
+            # START LOADING MODELS WHILE THE USER PICKS A COLUMN (POOL WORKERS LOAD THEIR OWN)
+            runtime = self.runtime.get()
+            if self.workers.get() == 1 and not model_registry.is_loaded(
+                    model_registry.model_key("bart", SmartSummarizer.MODEL_NAME, runtime)):
+                model_registry.warm_up("smart", runtime=runtime)
     
     def load_columns(self, file_path):
         try:
-            df = pd.read_excel(file_path)
-            self.column_dropdown['values'] = df.columns.tolist()
-            if len(df.columns) > 0:
-                self.column_name.set(df.columns[0])
+            self.sheets_columns = workbook_columns(file_path)
+            columns = next(iter(self.sheets_columns.values()), [])
+            self.column_dropdown['values'] = columns
+            if len(columns) > 0:
+                self.column_name.set(columns[0])
+            self.set_selection(None)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read file: {e}")
     
+    def choose_selection(self):
+        if not self.sheets_columns:
+            messagebox.showerror("Error", "Please select an Excel file first!")
+            return
+        dialog = SelectionDialog(self.root, self.sheets_columns, self.selection)
+        if dialog.selection is not None:
+            self.set_selection(dialog.selection)
+    
+    def set_selection(self, selection):
+        self.selection = selection
+        self.selection_text.set(describe(selection) if selection else "")
+    
     def process_file(self):
+        if self.job_panel.running:
+            return
+        
         if not self.file_path.get():
             messagebox.showerror("Error", "Please select an Excel file first!")
             return
         
-        if not self.column_name.get():
+        if not self.column_name.get() and not self.selection:
             messagebox.showerror("Error", "Please select a column!")
             return
         
+        # ASK FOR THE OUTPUT FIRST: RESULTS ARE WRITTEN AS EACH CHUNK FINISHES
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=OUTPUT_FILETYPES,
+            title="Save Summarized File As"
+        )
+        if not output_path:
+            return
+        
+        # RESUME FROM THE JOURNAL OF AN INTERRUPTED RUN ON THE SAME OUTPUT
+        checkpoint = JobCheckpoint(output_path)
+        if checkpoint.exists() and not messagebox.askyesno(
+                "Resume", "An unfinished run was found for this output file. Resume it?"):
+            checkpoint.discard()
+        
         try:
-            # INITIALIZE SUMMARIZER
-            self.status_label.config(text="Loading AI models... (please wait)", fg="blue")
-            self.root.update()
-            
-            self.summarizer = SmartSummarizer()
+            # ROWS ALREADY SUMMARIZED WITH THE SAME SETTINGS COME FROM THE CACHE
+            cache = SummaryCache(force_refresh=self.force_refresh.get())
+            # READ TK VARIABLES HERE: THE JOB ITSELF RUNS ON A WORKER THREAD
+            max_length, min_length = self.max_words.get(), self.min_words.get()
+            workers = max(1, self.workers.get())
+            long_documents = self.long_documents.get()
+            runtime = self.runtime.get()
+            profile = self.profile.get()
+            dedup = None if self.dedup_method.get() == "off" else Deduplicator(self.dedup_method.get(),
+                                                                                threshold=self.similarity.get())
+            params = SmartSummarizer.cache_params(max_length=max_length, min_length=min_length,
+                                                  runtime=runtime, profile=profile)
+            if long_documents:
+                params["long_documents"] = True
             
-            # READ EXCEL FILE
-            df = pd.read_excel(self.file_path.get())
+            def key_for(text):
+                return cache.key(text, "smart", SmartSummarizer.MODEL_NAME, **params) if needs_summary(text) else None
             
-            # SUMMARIZE EACH ENTRY
-            summaries = []
-            for text in tqdm(df[self.column_name.get()], desc="Generating smart summaries"):
-                if pd.isna(text) or len(str(text).split()) < 10:
-                    summaries.append("")
-                    continue
+            def summarize_missing(missing_texts):
+                # INITIALIZE SUMMARIZER ONLY ONCE SOME ROWS ARE NOT CACHED; REUSED ACROSS RUNS
+                if self.summarizer is not None and (self.summarizer.workers, self.summarizer.runtime) != (workers, runtime):
+                    self.summarizer.close()
+                    self.summarizer = None
+                if self.summarizer is None:
+                    self.job_panel.status("Loading AI models... (please wait)")
+                    self.summarizer = ParallelSmartSummarizer(workers=workers, runtime=runtime, stats=self.stats)
+                self.summarizer.profile = profile
                 
-                summary = self.summarizer.generate_summary(
-                    str(text),
-                    max_length=self.max_words.get(),
-                    min_length=self.min_words.get()
-                )
-                summaries.append(summary)
-            
-            # ADD SUMMARIES TO DATAFRAME
-            df["Summary"] = summaries
+                # LONG TEXTS ARE SPLIT INTO WINDOWS AND REDUCED INSTEAD OF BEING TRUNCATED
+                if long_documents:
+                    long_summarizer = MapReduceSummarizer(
+                        self.summarizer.tokenizer, self.summarizer.summarize_all, cache=cache,
+                        cache_tag=dict(backend="smart", model=SmartSummarizer.MODEL_NAME, **generation_params(profile),
+                                       **model_registry.runtime_tag(runtime))
+                    )
+                    return long_summarizer.summarize_all(missing_texts, max_length=max_length, min_length=min_length)
+                
+                return self.summarizer.summarize_all(missing_texts, max_length=max_length, min_length=min_length)
             
-            # SAVE TO NEW FILE
-            output_path = filedialog.asksaveasfilename(
-                defaultextension=".xlsx",
-                filetypes=[("Excel Files", "*.xlsx")],
-                title="Save Summarized File As"
-            )
+            # EASY ROWS SKIP THE MODEL (router.py)
+            router = None
+            if self.route_texts.get():
+                router = CostRouter(summary_words=max_length, route_words=self.route_words.get())
+                key_for = router.key_for(key_for)
+                summarize_missing = router.summarize(summarize_missing)
             
-            if output_path:
-                df.to_excel(output_path, index=False)
-                self.status_label.config(text="Smart summarization complete!", fg="green")
-                messagebox.showinfo("Success", "Summaries saved successfully!")
+            # ENOUGH ROWS PER BATCH TO KEEP EVERY POOL WORKER BUSY BETWEEN PROGRESS UPDATES
+            job = SummaryJob(self.file_path.get(), self.column_name.get(), output_path,
+                             summarize_missing, key_for, cache=cache, checkpoint=checkpoint,
+                             summary_column="Summary", batch_rows=workers * 16 * 4, dedup=dedup,
+                             selection=self.selection)
         
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
             self.status_label.config(text="Error occurred!", fg="red")
+            return
+        
+        # TIMING REPORT: PER-ROW EVENTS GO TO <OUTPUT>.log.jsonl, THE SUMMARY TABLE TO <OUTPUT>.stats.txt
+        self.stats.reset()
+        report_path = None
+        if self.save_report.get():
+            report_path = output_path + ".stats.txt"
+            self.stats.open_log(output_path + ".log.jsonl")
+        
+        # RUN ON A WORKER THREAD SO THE WINDOW STAYS RESPONSIVE
+        self.process_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Summarizing...", fg="blue")
+        self.job_panel.start(job, lambda job, error: self.job_finished(job, error, cache, report_path, router))
+    
+    def job_finished(self, job, error, cache, report_path=None, router=None):
+        if router is not None:
+            self.stats.set_counters(routed_extractive=router.extractive_rows, routed_model=router.model_rows)
+        self.stats.add_job(job, cache)
+        self.stats.close()
+        cache.close()
+        self.process_button.config(state=tk.NORMAL)
+        if sys.stdout is not None:
+            print(self.stats.table())
+        if report_path:
+            try:
+                with open(report_path, "w", encoding="utf-8") as f:
+                    f.write(self.stats.table() + "\n")
+            except OSError as e:
+                print(f"Could not write timing report: {e}")
+        if error is not None:
+            messagebox.showerror("Error", f"An error occurred: {error}")
+            self.status_label.config(text="Error occurred!", fg="red")
+        elif job.cancelled:
+            self.status_label.config(text=f"Cancelled: {job.rows_done} rows saved. Run again on the same file to resume.",
+                                     fg="orange")
+        else:
+            message = f"Smart summarization complete! {cache.stats()}"
+            if job.dedup is not None:
+                message += f" {job.dedup.stats()}"
+            if router is not None:
+                message += f" {router.stats()}"
+            self.status_label.config(text=message, fg="green")
+            messagebox.showinfo("Success", "Summaries saved successfully!")
+    
+    def on_close(self):
+        # STOP A RUNNING JOB AND THE POOL WORKERS BEFORE THE WINDOW GOES AWAY
+        if self.job_panel.running:
+            self.job_panel.cancel()
+            self.job_panel.thread.join(timeout=5)
+        if self.summarizer is not None:
+            self.summarizer.close()
+        self.root.destroy()
 
 # RUN THE APPLICATION
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = SmartSummarizerApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
\ No newline at end of file
@@ -1,67 +1,42 @@
-import os
-import time
-import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import openai
 import dotenv
+from gpt_summarizer import DEFAULT_PACK_TOKENS, AsyncChatGPTSummarizer
+from summary_cache import SummaryCache, needs_summary
+from summary_job import SummaryJob
+from checkpoint import JobCheckpoint
+from dedup import DEFAULT_THRESHOLD, Deduplicator
+from excel_io import INPUT_FILETYPES, OUTPUT_FILETYPES, workbook_columns
+from selection_dialog import SelectionDialog, describe
+from router import CostRouter, default_route_words
+from job_panel import JobPanel
 
 
 dotenv.load_dotenv()
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY")) 
-
-class ChatGPTSummarizer:
-    def __init__(self):
-        pass
-
-    def summarize(self, text, min_words=40, max_words=50, max_retries=3):
-        prompt = (
-            f"|||NON-NEGOTIABLE INSTRUCTIONS|||\n"
-            f"Create a {min_words}-{max_words} word summary that:\n"
-            f"1. Is EXACTLY {max_words} words (ABSOLUTE LIMIT)\n"
-            f"2. Uses COMPLETE SENTENCES only\n"
-            f"3. Preserves ALL KEY INFORMATION from this 300+ word text:\n"
-            f"----------------\n"
-            f"{text}\n"
-            f"----------------\n"
-            f"FORMAT YOUR RESPONSE AS:\n"
-            f"[Your summary here]"
-        )
-        messages = [
-            {"role": "system", "content": "You are a ruthless summarization engine that never exceeds word limits."},
-            {"role": "user", "content": prompt}
-        ]
-        
-        for attempt in range(max_retries):
-            try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    temperature=0.5,
-                    max_tokens=150
-                )
-                summary = response.choices[0].message.content.strip()
-                return summary
-            except Exception as e:
-                print(f"Error during summarization (attempt {attempt+1}): {e}")
-                time.sleep(2)
-        return "[SUMMARY FAILED]"
-
 class SmartSummarizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Smart Summarizer")
-        self.root.geometry("600x500")
+        self.root.geometry("600x740")
         
         # Variables for file and settings
         self.file_path = tk.StringVar()
         self.column_name = tk.StringVar()
+        self.selection = None
+        self.selection_text = tk.StringVar()
+        self.sheets_columns = {}
         self.min_words = tk.IntVar(value=40)
         self.max_words = tk.IntVar(value=50)
+        self.concurrency = tk.IntVar(value=8)
+        self.force_refresh = tk.BooleanVar(value=False)
+        self.pack_texts = tk.BooleanVar(value=False)
+        self.route_texts = tk.BooleanVar(value=False)
+        self.route_words = tk.IntVar(value=default_route_words(self.max_words.get()))
+        self.dedup_method = tk.StringVar(value="exact")
+        self.similarity = tk.DoubleVar(value=DEFAULT_THRESHOLD)
         
-        self.summarizer = ChatGPTSummarizer()
+        self.summarizer = None
         
         self.create_widgets()
         
@@ -81,6 +56,13 @@ class SmartSummarizerApp:
         self.column_dropdown = ttk.Combobox(self.root, textvariable=self.column_name, state="readonly", width=50)
         self.column_dropdown.pack(pady=5)
         
+        # Several sheets and columns in one run (replaces the column above)
+        selection_frame = tk.Frame(self.root)
+        selection_frame.pack()
+        tk.Button(selection_frame, text="Sheets/columns...", command=self.choose_selection).pack(side=tk.LEFT)
+        tk.Label(selection_frame, textvariable=self.selection_text, fg="gray25").pack(side=tk.LEFT, padx=5)
+        self.column_dropdown.bind("<<ComboboxSelected>>", lambda event: self.set_selection(None))
+        
         # Summary length settings
         tk.Label(self.root, text="3. Set Summary Length (words)", font=("Arial", 12, "bold")).pack(anchor="w", padx=20, pady=(10,0))
         length_frame = tk.Frame(self.root)
@@ -89,74 +71,162 @@ class SmartSummarizerApp:
         tk.Entry(length_frame, textvariable=self.min_words, width=5).grid(row=0, column=1, padx=5, pady=5)
         tk.Label(length_frame, text="Max Words:").grid(row=0, column=2, padx=5, pady=5)
         tk.Entry(length_frame, textvariable=self.max_words, width=5).grid(row=0, column=3, padx=5, pady=5)
+        tk.Label(length_frame, text="Concurrency:").grid(row=0, column=4, padx=5, pady=5)
+        tk.Entry(length_frame, textvariable=self.concurrency, width=5).grid(row=0, column=5, padx=5, pady=5)
+        
+        # Repeated texts are sent once; minhash also catches near duplicates
+        dedup_frame = tk.Frame(self.root)
+        dedup_frame.pack(pady=(5,0))
+        tk.Label(dedup_frame, text="Duplicates:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(dedup_frame, textvariable=self.dedup_method, values=("off", "exact", "minhash"),
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        tk.Label(dedup_frame, text="Similarity:").pack(side=tk.LEFT, padx=5)
+        tk.Entry(dedup_frame, textvariable=self.similarity, width=5).pack(side=tk.LEFT, padx=5)
+        
+        tk.Checkbutton(self.root, text="Force refresh (ignore cached summaries)",
+                       variable=self.force_refresh).pack(pady=(10,0))
+        tk.Checkbutton(self.root, text="Pack short texts (several per request, fewer tokens)",
+                       variable=self.pack_texts).pack()
+        # Short, plain texts get an extractive summary instead of a paid request
+        route_frame = tk.Frame(self.root)
+        route_frame.pack()
+        tk.Checkbutton(route_frame, text="Extractive summary for texts up to",
+                       variable=self.route_texts).pack(side=tk.LEFT)
+        tk.Entry(route_frame, textvariable=self.route_words, width=5).pack(side=tk.LEFT)
+        tk.Label(route_frame, text="words").pack(side=tk.LEFT, padx=5)
         
         # Process button
-        tk.Button(self.root, text="Generate Summaries", command=self.process_file,
-                  bg="#2196F3", fg="white", font=("Arial", 12, "bold")).pack(pady=20, fill=tk.X, padx=50)
+        self.process_button = tk.Button(self.root, text="Generate Summaries", command=self.process_file,
+                                        bg="#2196F3", fg="white", font=("Arial", 12, "bold"))
+        self.process_button.pack(pady=(20, 5), fill=tk.X, padx=50)
+        
+        # Progress bar, live stats and Pause/Cancel (the job runs on a worker thread)
+        self.job_panel = JobPanel(self.root)
+        self.job_panel.pack()
         
         # Status label
-        self.status_label = tk.Label(self.root, text="", fg="green")
+        self.status_label = tk.Label(self.root, text="", fg="green", wraplength=550)
         self.status_label.pack()
     
     def browse_file(self):
-        file_path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xls")])
+        file_path = filedialog.askopenfilename(filetypes=INPUT_FILETYPES)
         if file_path:
             self.file_path.set(file_path)
             self.load_columns(file_path)
     
     def load_columns(self, file_path):
         try:
-            df = pd.read_excel(file_path, engine="openpyxl")
-            self.column_dropdown['values'] = df.columns.tolist()
-            if df.columns.tolist():
-                self.column_name.set(df.columns.tolist()[0])
+            self.sheets_columns = workbook_columns(file_path)
+            columns = next(iter(self.sheets_columns.values()), [])
+            self.column_dropdown['values'] = columns
+            if columns:
+                self.column_name.set(columns[0])
+            self.set_selection(None)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read file: {e}")
     
+    def choose_selection(self):
+        if not self.sheets_columns:
+            messagebox.showerror("Error", "Please select an Excel file first!")
+            return
+        dialog = SelectionDialog(self.root, self.sheets_columns, self.selection)
+        if dialog.selection is not None:
+            self.set_selection(dialog.selection)
+    
+    def set_selection(self, selection):
+        self.selection = selection
+        self.selection_text.set(describe(selection) if selection else "")
+    
     def process_file(self):
+        if self.job_panel.running:
+            return
+        
         if not self.file_path.get():
             messagebox.showerror("Error", "Please select an Excel file first!")
             return
         
-        if not self.column_name.get():
+        if not self.column_name.get() and not self.selection:
             messagebox.showerror("Error", "Please select a column!")
             return
         
+        # Ask for the output first: results are written as each chunk finishes
+        output_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                                   filetypes=OUTPUT_FILETYPES,
+                                                   title="Save Summarized File As")
+        if not output_path:
+            return
+        
+        # Resume from the journal of an interrupted run on the same output
+        checkpoint = JobCheckpoint(output_path)
+        if checkpoint.exists() and not messagebox.askyesno(
+                "Resume", "An unfinished run was found for this output file. Resume it?"):
+            checkpoint.discard()
+        
         try:
-            self.status_label.config(text="Processing file...", fg="blue")
-            self.root.update()
+            # Read Tk variables here: the job itself runs on a worker thread
+            min_words, max_words = self.min_words.get(), self.max_words.get()
+            concurrency = self.concurrency.get()
+            dedup = None if self.dedup_method.get() == "off" else Deduplicator(self.dedup_method.get(),
+                                                                                threshold=self.similarity.get())
+            
+            # Rows already summarized with the same settings come from the cache
+            pack_tokens = DEFAULT_PACK_TOKENS if self.pack_texts.get() else 0
+            self.summarizer = AsyncChatGPTSummarizer(concurrency=concurrency, pack_tokens=pack_tokens)
+            cache = SummaryCache(force_refresh=self.force_refresh.get())
+            params = self.summarizer.cache_params(min_words, max_words)
             
-            # Read the Excel file
-            df = pd.read_excel(self.file_path.get(), engine="openpyxl")
-            col = self.column_name.get()
+            def key_for(text):
+                return cache.key(text, "openai", self.summarizer.model, **params) if needs_summary(text) else None
             
-            summaries = []
-            total_rows = len(df)
-            for i, text in enumerate(df[col], start=1):
-                if pd.isna(text) or len(str(text).strip().split()) < 10:
-                    summaries.append("")
-                else:
-                    summary = self.summarizer.summarize(
-                        str(text),
-                        min_words=self.min_words.get(),
-                        max_words=self.max_words.get()
-                    )
-                    summaries.append(summary)
-                self.status_label.config(text=f"Processed {i}/{total_rows} rows")
-                self.root.update()
+            def summarize_missing(missing_texts):
+                return self.summarizer.summarize_all(missing_texts, min_words=min_words, max_words=max_words)
             
-            # Add the summaries to a new column and save to a new Excel file
-            df["Catalogue Summary"] = summaries
-            output_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                                       filetypes=[("Excel Files", "*.xlsx")],
-                                                       title="Save Summarized File As")
-            if output_path:
-                df.to_excel(output_path, index=False)
-                self.status_label.config(text="Summarization complete!", fg="green")
-                messagebox.showinfo("Success", "Smart summaries saved successfully!")
+            # Easy rows skip the API (router.py); the tokens they would have cost are estimated
+            router = None
+            if self.route_texts.get():
+                summarizer = self.summarizer
+                router = CostRouter(summary_words=max_words, route_words=self.route_words.get(),
+                                    estimate_tokens=lambda text: summarizer.estimate_tokens(
+                                        summarizer.build_messages(str(text), min_words, max_words)))
+                key_for = router.key_for(key_for)
+                summarize_missing = router.summarize(summarize_missing)
+            
+            # A few requests per connection between progress updates keeps the pool full
+            batch_rows = concurrency * 4 * (self.summarizer.pack_items if pack_tokens else 1)
+            job = SummaryJob(self.file_path.get(), self.column_name.get(), output_path,
+                             summarize_missing, key_for, cache=cache, checkpoint=checkpoint,
+                             summary_column="Catalogue Summary", batch_rows=batch_rows, dedup=dedup,
+                             selection=self.selection)
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
             self.status_label.config(text="Error occurred!", fg="red")
+            return
+        
+        # Run on a worker thread so the window stays responsive
+        self.process_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Summarizing...", fg="blue")
+        self.job_panel.start(job, lambda job, error: self.job_finished(job, error, cache, router))
+    
+    def job_finished(self, job, error, cache, router=None):
+        cache.close()
+        self.summarizer.close()
+        self.process_button.config(state=tk.NORMAL)
+        if error is not None:
+            messagebox.showerror("Error", f"An error occurred: {error}")
+            self.status_label.config(text="Error occurred!", fg="red")
+        elif job.cancelled:
+            self.status_label.config(text=f"Cancelled: {job.rows_done} rows saved. Run again on the same file to resume.",
+                                     fg="orange")
+        else:
+            message = f"Summarization complete! {cache.stats()}"
+            if job.dedup is not None:
+                message += f" {job.dedup.stats()}"
+            if router is not None:
+                message += f" {router.stats()}"
+            if self.summarizer.usage["texts"]:
+                message += f" {self.summarizer.usage_stats()}"
+            self.status_label.config(text=message, fg="green")
+            messagebox.showinfo("Success", "Smart summaries saved successfully!")
 
 if __name__ == "__main__":
     root = tk.Tk()
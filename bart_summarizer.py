@@ -0,0 +1,93 @@
+"""Batched BART summarization engine used by app.py and the command line (no Tk dependency)"""
+import sys
+import model_registry
+from decoding import DEFAULT_PROFILE, generation_params, length_limits, tokens_per_word
+from summary_cache import needs_summary
+
+MODEL_NAME = model_registry.BART_MODEL
+
+def is_out_of_memory(error):
+    """True for CUDA/CPU allocation failures raised by torch"""
+    message = str(error).lower()
+    return "out of memory" in message or "can't allocate memory" in message
+
+def load_pipeline(model_name=MODEL_NAME, runtime="torch"):
+    # Loaded once per process and shared; heavy imports happen only now
+    return model_registry.summarization_pipeline(model_name, runtime)
+
+class BatchSummarizer:
+    """Batched, length-bucketed inference on top of a summarization pipeline"""
+    def __init__(self, summarizer, batch_size=8, profile=DEFAULT_PROFILE):
+        self.summarizer = summarizer
+        self.batch_size = max(1, int(batch_size))
+        self.profile = profile
+
+    @staticmethod
+    def cache_params(max_length=200, min_length=100, runtime="torch", profile=DEFAULT_PROFILE):
+        """Settings that change the output, used in the summary cache key"""
+        return dict(max_words=max_length, min_words=min_length, **generation_params(profile),
+                    **model_registry.runtime_tag(runtime))
+
+    @property
+    def tokenizer(self):
+        return self.summarizer.tokenizer
+
+    def token_lengths(self, texts):
+        """Untruncated token counts, so tokens per word is measured on whole texts"""
+        encoded = self.tokenizer(texts, verbose=False)
+        return [len(ids) for ids in encoded['input_ids']]
+
+    def summarize_all(self, texts, max_length=200, min_length=100):
+        """Summarize every text, returning results in the original row order.
+
+        Lengths are in words; each batch converts them to tokens for its own inputs."""
+        import torch
+        from tqdm import tqdm
+        
+        summaries = [""] * len(texts)
+        todo = [i for i, text in enumerate(texts) if needs_summary(text)]
+        if not todo:
+            return summaries
+        
+        # Sort rows by token length so each batch holds similar lengths and pads little
+        lengths = self.token_lengths([str(texts[i]) for i in todo])
+        token_count = dict(zip(todo, lengths))
+        order = [i for _, i in sorted(zip(lengths, todo))]
+        params = generation_params(self.profile)
+        
+        # Windowed builds have no stderr to draw on
+        progress = tqdm(total=len(order), desc="Summarizing", disable=sys.stderr is None)
+        start = 0
+        while start < len(order):
+            batch = order[start:start + self.batch_size]
+            batch_texts = [str(texts[i]) for i in batch]
+            counts = [token_count[i] for i in batch]
+            # The shortest input in the batch sets the cap, so no row is stretched past what BART reads of it
+            min_tokens, max_tokens = length_limits(min_length, max_length,
+                                                   min(min(counts), self.tokenizer.model_max_length),
+                                                   tokens_per_word(batch_texts, counts))
+            try:
+                results = self.summarizer(
+                    batch_texts,
+                    batch_size=len(batch),
+                    max_length=max_tokens,
+                    min_length=min_tokens,
+                    truncation=True,
+                    **params
+                )
+            except RuntimeError as e:
+                if not is_out_of_memory(e) or self.batch_size == 1:
+                    raise
+                # Back off: halve the batch and retry the same rows
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                self.batch_size = max(1, self.batch_size // 2)
+                print(f"Out of memory, retrying with batch size {self.batch_size}")
+                continue
+            
+            for i, result in zip(batch, results):
+                summaries[i] = result['summary_text']
+            start += len(batch)
+            progress.update(len(batch))
+        progress.close()
+        return summaries
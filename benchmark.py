@@ -0,0 +1,305 @@
+"""Reproducible benchmark for the three summarizer backends.
+
+    python benchmark.py --backends openai --mock-latency 0.2 --concurrency 1 8 32
+    python benchmark.py --backends openai --distributions short --pack-tokens 0 3000
+    python benchmark.py --backends bart smart --batch-sizes 4 8 16 --workers 1 2 --json bench.json --csv bench.csv
+
+The corpus is a fixed synthetic set of prefaces, seeded so every run sees the same texts,
+at several length distributions. Use --corpus to benchmark your own file instead. Each
+configuration runs in a fresh process, so model load time and peak RSS are measured per
+configuration instead of being shared through the model registry. The OpenAI backend always
+talks to mock_openai_server.py, never to the real API.
+
+Rows are submitted in calls of --call-rows rows, as the apps do. A row's latency is the time
+from its call being submitted until its summary is returned. For OpenAI the requests and
+billed tokens per row are recorded too (the mock counts ~4 characters per token)."""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from instrumentation import percentile
+
+BACKENDS = ("bart", "smart", "openai")
+
+# Words per preface for each length distribution; "mixed" draws from all of them
+DISTRIBUTIONS = {
+    "short": (40, 120),
+    "medium": (150, 400),
+    "long": (600, 1400),
+}
+VOCABULARY = (
+    "the author history library edition chapter reader volume collection archive manuscript "
+    "century literature translation introduction study early modern novel poetry essay letters "
+    "university press critical text notes index society culture political religious science "
+    "philosophy war empire city family life work years first new world english french german "
+    "research sources evidence period tradition influence movement theory practice account "
+    "narrative biography memoir travel journal record public private revised expanded"
+).split()
+
+CSV_FIELDS = ["timestamp", "version", "backend", "distribution", "setting", "value", "runtime", "profile",
+              "pack_tokens", "rows", "call_rows", "load_seconds", "seconds", "rows_per_second", "p50_latency",
+              "p95_latency", "peak_rss_mb", "peak_worker_rss_mb", "requests_per_row", "tokens_per_row",
+              "failed", "error"]
+
+
+def make_preface(rng, words):
+    sentences, count = [], 0
+    while count < words:
+        length = rng.randint(8, 24)
+        sentences.append(" ".join(rng.choice(VOCABULARY) for _ in range(length)).capitalize() + ".")
+        count += length
+    return " ".join(sentences)
+
+
+def make_corpus(distribution, rows, seed=0):
+    """The same `rows` texts for the same distribution and seed, on every machine"""
+    rng = random.Random(f"{seed}:{distribution}")
+    names = list(DISTRIBUTIONS) if distribution == "mixed" else [distribution]
+    texts = []
+    for _ in range(rows):
+        low, high = DISTRIBUTIONS[rng.choice(names)]
+        texts.append(make_preface(rng, rng.randint(low, high)))
+    return texts
+
+
+def peak_rss_mb():
+    """(this process, largest finished child process) peak resident memory in MB; None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own * scale / 2 ** 20, 1), round(children * scale / 2 ** 20, 1) if children else None
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_engine(config):
+    """Returns (summarize(texts, on_row_done) -> summaries, close, usage) with the models loaded;
+    usage counts OpenAI requests and tokens, None for the local backends"""
+    from summarize import DEFAULTS
+    lengths = DEFAULTS[config["backend"]]
+
+    if config["backend"] == "bart":
+        from bart_summarizer import BatchSummarizer, load_pipeline
+        engine = BatchSummarizer(load_pipeline(runtime=config["runtime"]), batch_size=config["value"],
+                                 profile=config["profile"])
+        return (lambda texts, done: engine.summarize_all(texts, max_length=lengths["max_words"],
+                                                         min_length=lengths["min_words"])), lambda: None, None
+
+    if config["backend"] == "smart":
+        from smart_summarizer import ParallelSmartSummarizer
+        # Pool workers load their models in the background, so with workers > 1 most of
+        # the load time shows up in the first call instead of load_seconds
+        engine = ParallelSmartSummarizer(workers=config["value"], runtime=config["runtime"],
+                                         profile=config["profile"])
+        return (lambda texts, done: engine.summarize_all(texts, max_length=lengths["max_words"],
+                                                         min_length=lengths["min_words"])), engine.close, None
+
+    import importlib
+    import mock_openai_server
+    from gpt_summarizer import AsyncChatGPTSummarizer
+    # Import the client libraries now so the first call doesn't pay for it
+    for module in ("httpx", "openai"):
+        importlib.import_module(module)
+    server, base_url = mock_openai_server.start_in_thread(port=0, latency=config["mock_latency"])
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    # Limits far above the mock's throughput: measure the engine, not the rate limiter
+    engine = AsyncChatGPTSummarizer(concurrency=config["value"], requests_per_minute=10 ** 7,
+                                    tokens_per_minute=10 ** 10, pack_tokens=config["pack_tokens"])
+
+    def close():
+        engine.close()
+        server.shutdown()
+
+    return (lambda texts, done: engine.summarize_all(texts, min_words=lengths["min_words"],
+                                                     max_words=lengths["max_words"], progress=done)), \
+        close, engine.usage
+
+
+def run_config(config):
+    """Run one configuration in this process and return its measurements"""
+    import warnings
+    warnings.filterwarnings("ignore")
+    texts = make_corpus(config["distribution"], config["rows"], config["seed"]) if not config["corpus"] else \
+        load_corpus(config["corpus"], config["column"], config["rows"])
+
+    start = time.perf_counter()
+    summarize, close, usage = load_engine(config)
+    load_seconds = time.perf_counter() - start
+
+    latencies, failed = [], 0
+    run_start = time.perf_counter()
+    try:
+        for first in range(0, len(texts), config["call_rows"]):
+            batch = texts[first:first + config["call_rows"]]
+            submitted = time.perf_counter()
+            finished = []
+            summaries = summarize(batch, lambda: finished.append(time.perf_counter()))
+            returned = time.perf_counter()
+            # Engines that report each row (OpenAI) give per-row times; batched ones finish together
+            finished += [returned] * (len(batch) - len(finished))
+            latencies += [t - submitted for t in finished]
+            failed += sum(s == "[SUMMARY FAILED]" for s in summaries)
+    finally:
+        close()
+    seconds = time.perf_counter() - run_start
+
+    own_rss, worker_rss = peak_rss_mb()
+    if config["backend"] != "smart" or config["value"] < 2:
+        worker_rss = None
+    requests_per_row = tokens_per_row = None
+    if usage is not None and texts:
+        requests_per_row = round((usage["single_requests"] + usage["packed_requests"]) / len(texts), 3)
+        tokens_per_row = round((usage["prompt_tokens"] + usage["completion_tokens"]) / len(texts), 1)
+    return dict(config, rows=len(texts), load_seconds=round(load_seconds, 3), seconds=round(seconds, 3),
+                rows_per_second=round(len(texts) / seconds, 3) if seconds else None,
+                p50_latency=percentile(latencies, 0.50), p95_latency=percentile(latencies, 0.95),
+                peak_rss_mb=own_rss, peak_worker_rss_mb=worker_rss, requests_per_row=requests_per_row,
+                tokens_per_row=tokens_per_row, failed=failed)
+
+
+def load_corpus(path, column, rows):
+    from excel_io import iter_chunks
+    texts = []
+    for chunk in iter_chunks(path):
+        texts.extend(str(t) for t in chunk[column].dropna())
+        if len(texts) >= rows:
+            break
+    return texts[:rows]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the summarizer backends on a fixed corpus.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--distributions", nargs="+", choices=list(DISTRIBUTIONS) + ["mixed"],
+                        default=["short", "medium", "long", "mixed"], help="Preface length distributions")
+    parser.add_argument("--rows", type=int, default=32, help="Rows per distribution")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (keep fixed to compare versions)")
+    parser.add_argument("--corpus", help="Benchmark this .xlsx/.csv/.parquet file instead of the synthetic corpus")
+    parser.add_argument("--column", default="Preface", help="Text column of --corpus")
+    parser.add_argument("--call-rows", type=int,
+                        help="Rows per engine call (default: what the apps use for each backend)")
+
+    settings = parser.add_argument_group("settings to sweep")
+    settings.add_argument("--batch-sizes", nargs="+", type=int, default=[8], help="bart: rows per forward pass")
+    settings.add_argument("--workers", nargs="+", type=int, default=[1], help="smart: worker processes")
+    settings.add_argument("--concurrency", nargs="+", type=int, default=[8], help="openai: parallel requests")
+    settings.add_argument("--runtime", choices=("torch", "int8", "onnx"), default="torch", help="bart/smart runtime")
+    settings.add_argument("--profile", choices=("fast", "balanced", "quality"), default="balanced",
+                          help="bart/smart decoding profile")
+    settings.add_argument("--pack-tokens", nargs="+", type=int, default=[0],
+                          help="openai: prompt token budget for packing several rows per request (0 = off)")
+    settings.add_argument("--mock-latency", type=float, default=0.2, help="openai: mock server seconds per request")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--json", help="Write all results to this JSON file")
+    output.add_argument("--csv", help="Append results to this CSV file (one row per configuration)")
+    output.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def configurations(args):
+    sweeps = {"bart": ("batch_size", args.batch_sizes), "smart": ("workers", args.workers),
+              "openai": ("concurrency", args.concurrency)}
+    # Same call sizes as the apps' SummaryJob batch_rows (packed OpenAI calls hold 16 rows per request)
+    call_rows = {"bart": lambda v, p: v * 8, "smart": lambda v, p: v * 16 * 4,
+                 "openai": lambda v, p: v * 4 * (16 if p else 1)}
+    distributions = ["corpus"] if args.corpus else args.distributions
+    for backend in args.backends:
+        setting, values = sweeps[backend]
+        for distribution in distributions:
+            for value in values:
+                for pack_tokens in (args.pack_tokens if backend == "openai" else [None]):
+                    yield dict(backend=backend, distribution=distribution, setting=setting, value=value,
+                               runtime=args.runtime if backend != "openai" else None,
+                               profile=args.profile if backend != "openai" else None, pack_tokens=pack_tokens,
+                               rows=args.rows, seed=args.seed, corpus=args.corpus, column=args.column,
+                               call_rows=args.call_rows or call_rows[backend](value, pack_tokens),
+                               mock_latency=args.mock_latency)
+
+
+def run_in_child(config):
+    """Run a configuration in a fresh interpreter; returns its result or an error record"""
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(config)],
+                             capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    lines = process.stdout.strip().splitlines()
+    # The result is the last line; anything before it (request errors and retries) is passed on
+    for line in (lines[:-1] if process.returncode == 0 else lines):
+        print(line, file=sys.stderr)
+    if process.returncode == 0 and lines:
+        return json.loads(lines[-1])
+    error = (process.stderr.strip().splitlines() or ["exit code %d" % process.returncode])[-1]
+    return dict(config, error=error)
+
+
+def write_csv(path, results, meta):
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        for result in results:
+            writer.writerow(dict(result, timestamp=meta["timestamp"], version=meta["version"]))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(run_config(json.loads(args.child))))
+        return 0
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+    }
+    results = []
+    for config in configurations(args):
+        label = f"{config['backend']} {config['distribution']} {config['setting']}={config['value']}"
+        if config["pack_tokens"]:
+            label += f" pack_tokens={config['pack_tokens']}"
+        print(f"Running {label}...", file=sys.stderr)
+        result = run_in_child(config)
+        results.append(result)
+        if result.get("error"):
+            print(f"  failed: {result['error']}", file=sys.stderr)
+        else:
+            print(f"  {result['rows_per_second']} rows/s, p50 {result['p50_latency']}s, "
+                  f"p95 {result['p95_latency']}s, load {result['load_seconds']}s, "
+                  f"peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+            if result.get("requests_per_row") is not None:
+                print(f"  {result['requests_per_row']} requests/row, {result['tokens_per_row']} tokens/row",
+                      file=sys.stderr)
+
+    report = {"meta": meta, "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, results, meta)
+    if not args.json and not args.csv:
+        print(json.dumps(report, indent=2))
+    return 1 if any(r.get("error") for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
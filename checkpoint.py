@@ -0,0 +1,77 @@
+"""Sidecar journal of finished rows, so an interrupted job can resume where it stopped"""
+import json
+import os
+from summary_cache import UNCACHEABLE
+
+
+class JobCheckpoint:
+    """Append-only JSON-lines file next to the output: one {row, key, summary} record per finished row.
+
+    Records are written by flush(), which SummaryJob calls after every batch it sends to the
+    model, so a crash loses at most the batch in flight. A row is only reused on resume when
+    its cache key still matches: the key covers the normalized text and every setting that
+    changes the summary (backend, model, lengths, profile, runtime)."""
+    def __init__(self, output_path):
+        self.path = output_path + ".checkpoint.jsonl"
+        self.done = {}
+        self.pending = []
+        self.handle = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Read finished rows from an earlier run; returns how many were found"""
+        self.done = {}
+        if not self.exists():
+            return 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line half-written
+                    continue
+                # Journals without keys predate settings checks and are not trusted
+                if "key" in record:
+                    self.done[record["row"]] = (record["key"], record["summary"])
+        return len(self.done)
+
+    def discard(self):
+        self.done = {}
+        if self.exists():
+            os.remove(self.path)
+
+    def lookup(self, row, key):
+        entry = self.done.get(row)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def record(self, row, key, summary):
+        # Failed rows are left out so a resumed job retries them
+        if summary in UNCACHEABLE:
+            return
+        self.pending.append({"row": row, "key": key, "summary": summary})
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.handle is None:
+            self.handle = open(self.path, "a", encoding="utf-8")
+        self.handle.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.pending))
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.pending = []
+
+    def close(self):
+        """Flush and keep the journal (job interrupted)"""
+        self.flush()
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def finish(self):
+        """Job completed: the journal is no longer needed"""
+        self.close()
+        self.discard()
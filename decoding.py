@@ -0,0 +1,46 @@
+"""Decoding profiles and word-based length control shared by the BART engines.
+
+The apps ask for summary lengths in words, but generate() counts tokens. Lengths are
+converted with the tokens-per-word ratio of the texts being summarized and capped by the
+input length, so a 60-word preface is not stretched into a 130-token summary."""
+
+# Beam search settings per profile; "quality" is bart-large-cnn's own default
+PROFILES = {
+    "fast": dict(num_beams=1, no_repeat_ngram_size=3),
+    "balanced": dict(num_beams=2, length_penalty=1.0, no_repeat_ngram_size=3, early_stopping=True),
+    "quality": dict(num_beams=4, length_penalty=2.0, no_repeat_ngram_size=3, early_stopping=True),
+}
+DEFAULT_PROFILE = "balanced"
+
+# BART's byte-level BPE averages about 1.3 tokens per English word
+TOKENS_PER_WORD = 1.3
+# A summary may use at most this share of the input's tokens...
+MAX_OUTPUT_RATIO = 0.8
+# ...but is never capped below this many tokens
+MIN_OUTPUT_TOKENS = 16
+# generate() counts the decoder start and end tokens in min_length/max_length
+SPECIAL_TOKENS = 2
+
+
+def generation_params(profile=DEFAULT_PROFILE):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown decoding profile '{profile}', expected one of {', '.join(PROFILES)}")
+    return dict(PROFILES[profile])
+
+
+def tokens_per_word(texts, token_counts):
+    """Tokens per word measured on the inputs (names, numbers and non-English text run higher).
+    token_counts must be untruncated: 1024 tokens over a 2000-word text would read as 0.5."""
+    words = sum(len(str(text).split()) for text in texts)
+    if not words:
+        return TOKENS_PER_WORD
+    return min(max(sum(token_counts) / words, 1.0), 3.0)
+
+
+def length_limits(min_words, max_words, input_tokens, ratio=TOKENS_PER_WORD):
+    """(min_length, max_length) in tokens for generate()"""
+    cap = max(MIN_OUTPUT_TOKENS, int(input_tokens * MAX_OUTPUT_RATIO))
+    max_tokens = max(MIN_OUTPUT_TOKENS, min(round(max_words * ratio), cap))
+    # Leave the model room to stop: the minimum is at most half the maximum
+    min_tokens = min(round(min_words * ratio), max_tokens // 2)
+    return min_tokens + SPECIAL_TOKENS, max_tokens + SPECIAL_TOKENS
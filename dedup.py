@@ -0,0 +1,257 @@
+"""Duplicate detection before summarization, so repeated prefaces are summarized once.
+
+Exact duplicates share a cache key (the key hashes the whitespace-normalized text), so they
+are grouped for free. Near duplicates, such as reprints with a changed sentence or a new
+edition note, can be clustered with MinHash/LSH over word shingles ("minhash") or with MiniLM
+sentence embeddings ("embedding"). Only one representative per cluster goes to the model.
+Its summary is copied to every member. The index lives for the whole run, so a duplicate
+of a row from an earlier batch is not summarized again either."""
+import csv
+import zlib
+import numpy as np
+from summary_cache import UNCACHEABLE
+
+METHODS = ("off", "exact", "minhash", "embedding")
+# Jaccard similarity of word shingles (minhash) or cosine similarity (embedding)
+DEFAULT_THRESHOLD = 0.9
+# 32-bit universal hashing: a * h + b stays below 2**64
+PRIME = (1 << 32) - 5
+
+
+def shingles(text, size=5):
+    """crc32 hashes of the lower-cased `size`-word shingles of text"""
+    words = str(text).lower().split()
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return np.array(sorted({zlib.crc32(g.encode("utf-8")) for g in grams}), dtype=np.uint64)
+
+
+def lsh_bands(num_perm, threshold):
+    """(bands, rows) whose LSH S-curve threshold is just below `threshold`, favoring recall;
+    every candidate pair is verified against the signatures afterwards"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        knee = (1.0 / bands) ** (1.0 / rows)
+        if knee <= threshold and (best is None or knee > best[0]):
+            best = (knee, bands, rows)
+    return (best[1], best[2]) if best else (num_perm, 1)
+
+
+class MinHashIndex:
+    """Leader clustering over MinHash signatures with banded LSH lookup"""
+    def __init__(self, threshold, num_perm=128, shingle_size=5, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, PRIME, num_perm).astype(np.uint64)
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self.buckets = {}
+        self.signatures = []
+
+    def signature(self, text):
+        hashes = shingles(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME).min(axis=1)
+
+    def band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def match(self, signature):
+        """(leader id, estimated Jaccard) of the most similar leader above the threshold, else (None, 0)"""
+        candidates = {leader for key in self.band_keys(signature) for leader in self.buckets.get(key, ())}
+        best, best_score = None, 0.0
+        for leader in candidates:
+            score = float(np.mean(self.signatures[leader] == signature))
+            if score >= self.threshold and score > best_score:
+                best, best_score = leader, score
+        return best, best_score
+
+    def add(self, signature):
+        leader = len(self.signatures)
+        self.signatures.append(signature)
+        for key in self.band_keys(signature):
+            self.buckets.setdefault(key, []).append(leader)
+        return leader
+
+    def assign(self, texts):
+        """For each text: (leader id, similarity, is_new_leader); leader None when it can't be compared"""
+        assigned = []
+        for text in texts:
+            signature = self.signature(text)
+            if signature is None:
+                assigned.append((None, 0.0, False))
+                continue
+            leader, score = self.match(signature)
+            if leader is None:
+                assigned.append((self.add(signature), 1.0, True))
+            else:
+                assigned.append((leader, score, False))
+        return assigned
+
+
+class EmbeddingIndex:
+    """Leader clustering by cosine similarity of MiniLM embeddings (the registry's shared encoder).
+    MiniLM reads roughly the first 200 words, so texts that only differ later look identical.
+
+    Leaders live in a buffer that doubles when full. Each batch is scored against the earlier
+    leaders with one matrix product, and against itself with another for leaders it adds."""
+    def __init__(self, threshold, batch_size=256):
+        import model_registry
+        self.model = model_registry.sentence_model()
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.buffer = None
+        self.count = 0
+
+    def add(self, vectors):
+        if self.buffer is None:
+            self.buffer = np.empty((max(64, len(vectors)), vectors.shape[1]), dtype=vectors.dtype)
+        if self.count + len(vectors) > len(self.buffer):
+            grown = np.empty((max(2 * len(self.buffer), self.count + len(vectors)), self.buffer.shape[1]),
+                             dtype=self.buffer.dtype)
+            grown[:self.count] = self.buffer[:self.count]
+            self.buffer = grown
+        self.buffer[self.count:self.count + len(vectors)] = vectors
+        self.count += len(vectors)
+
+    def assign(self, texts):
+        embeddings = np.asarray(self.model.encode([str(t) for t in texts], batch_size=self.batch_size,
+                                                  normalize_embeddings=True))
+        if self.count:
+            earlier = embeddings @ self.buffer[:self.count].T
+            earlier_best = earlier.argmax(axis=1)
+            earlier_score = earlier[np.arange(len(texts)), earlier_best]
+        within = embeddings @ embeddings.T
+        assigned, added = [], []
+        for k in range(len(texts)):
+            best, best_score = None, -1.0
+            if self.count:
+                best, best_score = int(earlier_best[k]), float(earlier_score[k])
+            if added:
+                scores = within[k, added]
+                j = int(np.argmax(scores))
+                if scores[j] > best_score:
+                    best, best_score = self.count + j, float(scores[j])
+            if best is not None and best_score >= self.threshold:
+                assigned.append((best, best_score, False))
+            else:
+                assigned.append((self.count + len(added), 1.0, True))
+                added.append(k)
+        if added:
+            self.add(embeddings[added])
+        return assigned
+
+
+class Deduplicator:
+    """Summarizes one representative per group of duplicate rows and fans its summary out.
+
+    method: "exact" (identical normalized text) or "minhash"/"embedding" (also near duplicates
+    with similarity >= threshold). With report=True every reused row is recorded for write_report."""
+    def __init__(self, method="exact", threshold=DEFAULT_THRESHOLD, report=False):
+        if method not in METHODS or method == "off":
+            raise ValueError(f"Unknown dedup method '{method}', expected one of {', '.join(METHODS[1:])}")
+        self.method = method
+        self.threshold = threshold
+        self.report = report
+        self.index = None
+        # key -> (summary, representative row); leader id -> (summary, representative row)
+        self.exact = {}
+        self.leaders = {}
+        self.rows_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.pairs = []
+
+    @property
+    def saved(self):
+        """Model calls saved so far"""
+        return self.exact_duplicates + self.near_duplicates
+
+    def near_index(self):
+        if self.index is None:
+            self.index = MinHashIndex(self.threshold) if self.method == "minhash" else EmbeddingIndex(self.threshold)
+        return self.index
+
+    def reuse(self, row, representative, kind, similarity):
+        if kind == "exact":
+            self.exact_duplicates += 1
+        else:
+            self.near_duplicates += 1
+        if self.report:
+            self.pairs.append((row, representative, kind, round(similarity, 4)))
+
+    def summarize(self, texts, keys, summarize, rows=None):
+        """summarize(texts, keys) -> summaries is called once, with the representatives only"""
+        rows = rows if rows is not None else list(range(self.rows_seen, self.rows_seen + len(texts)))
+        self.rows_seen += len(texts)
+        summaries = [None] * len(texts)
+
+        # Exact duplicates: same key, within this batch or from an earlier one
+        first_of_key, unique = {}, []
+        for i, key in enumerate(keys):
+            if key in self.exact:
+                summaries[i] = self.exact[key][0]
+                self.reuse(rows[i], self.exact[key][1], "exact", 1.0)
+            elif key in first_of_key:
+                self.reuse(rows[i], rows[first_of_key[key]], "exact", 1.0)
+            else:
+                first_of_key[key] = i
+                unique.append(i)
+
+        # Near duplicates among the remaining unique texts
+        representatives, follows, new_leaders = unique, {}, {}
+        if self.method in ("minhash", "embedding") and unique:
+            representatives = []
+            for i, (leader, similarity, is_new) in zip(unique, self.near_index().assign([texts[i] for i in unique])):
+                if leader is None or is_new:
+                    representatives.append(i)
+                    if leader is not None:
+                        new_leaders[leader] = i
+                elif leader in self.leaders:
+                    summaries[i] = self.leaders[leader][0]
+                    self.reuse(rows[i], self.leaders[leader][1], self.method, similarity)
+                elif leader in new_leaders:
+                    follows[i] = new_leaders[leader]
+                    self.reuse(rows[i], rows[new_leaders[leader]], self.method, similarity)
+                else:
+                    # The leader's own summary failed in an earlier batch: this text stands in for it
+                    representatives.append(i)
+                    new_leaders[leader] = i
+
+        results = summarize([texts[i] for i in representatives], [keys[i] for i in representatives]) \
+            if representatives else []
+        for i, summary in zip(representatives, results):
+            summaries[i] = summary
+        for i, representative in follows.items():
+            summaries[i] = summaries[representative]
+        for i, key in enumerate(keys):
+            if summaries[i] is None:
+                summaries[i] = summaries[first_of_key[key]]
+
+        # Remember this batch's texts for later batches (failed rows are retried instead)
+        for i in unique:
+            if summaries[i] not in UNCACHEABLE:
+                self.exact[keys[i]] = (summaries[i], rows[i])
+        for leader, i in new_leaders.items():
+            if summaries[i] not in UNCACHEABLE:
+                self.leaders[leader] = (summaries[i], rows[i])
+        return summaries
+
+    def stats(self):
+        return (f"Duplicates: {self.exact_duplicates} exact, {self.near_duplicates} near "
+                f"({self.saved} model calls saved)")
+
+    def write_report(self, path):
+        """CSV of every row that reused another row's summary: 0-based data rows, or positions
+        in the job's row-by-row list of texts when several columns are summarized"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "representative_row", "match", "similarity"])
+            writer.writerows(self.pairs)
@@ -0,0 +1,250 @@
+"""Streaming spreadsheet I/O: header-only reads, chunked row iteration and incremental writes.
+
+Supports .xlsx (openpyxl read-only / write-only), .csv and .parquet (pyarrow).
+Legacy .xls files cannot be streamed and are read whole. Functions that take a `sheet`
+read the first sheet when it is None; CSV and Parquet files have that one sheet only."""
+import csv
+import os
+import pandas as pd
+
+INPUT_FILETYPES = [
+    ("Spreadsheets", "*.xlsx *.xlsm *.xls *.csv *.parquet"),
+    ("Excel Files", "*.xlsx *.xls"),
+    ("CSV Files", "*.csv"),
+    ("Parquet Files", "*.parquet")
+]
+OUTPUT_FILETYPES = [
+    ("Excel Files", "*.xlsx"),
+    ("CSV Files", "*.csv"),
+    ("Parquet Files", "*.parquet")
+]
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if extension in (".xls", ".csv", ".parquet"):
+        return extension[1:]
+    raise ValueError(f"Unsupported file type: {extension or path}")
+
+
+def header_names(values):
+    return [str(v) if v is not None else f"Unnamed: {i}" for i, v in enumerate(values)]
+
+
+def check_sheet(path, sheet):
+    if sheet is not None and file_format(path) not in ("xlsx", "xls"):
+        raise ValueError(f"{os.path.basename(path)} has no sheets; only Excel workbooks do")
+
+
+def worksheet(workbook, sheet, path):
+    if sheet is None:
+        return workbook.worksheets[0]
+    if sheet not in workbook.sheetnames:
+        raise KeyError(f"Sheet '{sheet}' not found in {path}")
+    return workbook[sheet]
+
+
+def workbook_columns(path):
+    """{sheet name: column names} from the header row of every sheet, opening the file once.
+    CSV and Parquet files give {None: columns}."""
+    kind = file_format(path)
+    if kind == "xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return {sheet.title: header_names(next(sheet.iter_rows(max_row=1, values_only=True), ()))
+                    for sheet in workbook.worksheets}
+        finally:
+            workbook.close()
+    if kind == "xls":
+        return {name: frame.columns.tolist() for name, frame in pd.read_excel(path, sheet_name=None, nrows=0).items()}
+    return {None: read_columns(path)}
+
+
+def read_columns(path, sheet=None):
+    """Column names from the header row, without loading the rest of the file"""
+    check_sheet(path, sheet)
+    kind = file_format(path)
+    if kind == "xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            header = next(worksheet(workbook, sheet, path).iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return header_names(header)
+    if kind == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return next(csv.reader(f), [])
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return pd.read_excel(path, sheet_name=sheet if sheet is not None else 0, nrows=0).columns.tolist()
+
+
+def count_rows(path, sheet=None):
+    """Number of data rows if it can be found cheaply (used for progress/ETA), else None"""
+    kind = file_format(path)
+    try:
+        if kind == "xlsx":
+            import openpyxl
+            workbook = openpyxl.load_workbook(path, read_only=True)
+            try:
+                max_row = worksheet(workbook, sheet, path).max_row
+            finally:
+                workbook.close()
+            return max_row - 1 if max_row else None
+        if kind == "parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path).metadata.num_rows
+        if kind == "csv":
+            # Quoted cells may contain newlines, so this is an estimate
+            with open(path, "rb") as f:
+                return max(0, sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1)
+    except Exception:
+        return None
+    return None
+
+
+def worksheet_chunks(sheet, chunksize):
+    rows = sheet.iter_rows(values_only=True)
+    columns = header_names(next(rows, ()))
+    buffer, empty = [], True
+    for row in rows:
+        buffer.append(row[:len(columns)])
+        if len(buffer) >= chunksize:
+            yield pd.DataFrame(buffer, columns=columns)
+            buffer, empty = [], False
+    # A sheet with only a header still yields its (empty) table, so it is kept in the output
+    if buffer or empty:
+        yield pd.DataFrame(buffer, columns=columns)
+
+
+def iter_chunks(path, chunksize=1000, sheet=None):
+    """Yield one sheet as DataFrames of at most `chunksize` rows"""
+    for _, chunk in iter_sheets(path, [sheet], chunksize):
+        yield chunk
+
+
+def iter_sheets(path, sheets=None, chunksize=1000):
+    """Yield (sheet, DataFrame) chunks of each sheet in `sheets` in turn, opening the file once"""
+    sheets = list(sheets) if sheets else [None]
+    for sheet in sheets:
+        check_sheet(path, sheet)
+    kind = file_format(path)
+    if kind == "xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            for sheet in sheets:
+                for chunk in worksheet_chunks(worksheet(workbook, sheet, path), chunksize):
+                    yield sheet, chunk
+        finally:
+            workbook.close()
+    elif kind == "csv":
+        # Read every cell as text: pandas would guess types chunk by chunk, turning an ISBN
+        # such as 0306406152 into a number or 1 into 1.0 after a blank
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            yield None, chunk.where(chunk != "", None)
+    elif kind == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield None, batch.to_pandas()
+    else:
+        frames = pd.read_excel(path, sheet_name=[sheet if sheet is not None else 0 for sheet in sheets])
+        for sheet in sheets:
+            df = frames[sheet if sheet is not None else 0]
+            for start in range(0, len(df), chunksize):
+                yield sheet, df.iloc[start:start + chunksize].reset_index(drop=True)
+
+
+def input_schema(path):
+    """Arrow schema of a Parquet input, else None (CSV and Excel carry no column types)"""
+    if file_format(path) != "parquet":
+        return None
+    import pyarrow.parquet as pq
+    return pq.read_schema(path)
+
+
+class ChunkWriter:
+    """Appends DataFrame chunks to an .xlsx, .csv or .parquet file as they are produced.
+
+    An .xlsx file can take several sheets, written one after another. A Parquet file's schema
+    is fixed when it is opened, so it is not inferred from the first chunk: columns found in
+    `schema` (the input's, see input_schema) keep their type and all others are written as
+    strings, since an Excel column may hold numbers in one chunk and text in the next."""
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.input_schema = schema
+        self.kind = file_format(path)
+        if self.kind == "xls":
+            raise ValueError("Cannot write .xls files; save as .xlsx instead")
+        self.columns = None
+        self.handle = None
+        self.target = None
+        self.schema = None
+        self.sheet = None
+        self.sheets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self, df, sheet=None):
+        if self.handle is not None and self.kind != "xlsx":
+            raise ValueError(f"A .{self.kind} file holds one sheet; save as .xlsx to keep several")
+        if sheet in self.sheets:
+            raise ValueError(f"Sheet '{sheet}' was already written")
+        self.sheets.append(sheet)
+        self.sheet = sheet
+        self.columns = [str(c) for c in df.columns]
+        if self.kind == "xlsx":
+            import openpyxl
+            if self.handle is None:
+                self.handle = openpyxl.Workbook(write_only=True)
+            self.target = self.handle.create_sheet(title=sheet)
+            self.target.append(self.columns)
+        elif self.kind == "csv":
+            self.handle = open(self.path, "w", newline="", encoding="utf-8")
+            self.target = csv.writer(self.handle)
+            self.target.writerow(self.columns)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            known = self.input_schema.names if self.input_schema is not None else []
+            self.schema = pa.schema([self.input_schema.field(c) if c in known else pa.field(c, pa.string())
+                                     for c in self.columns])
+            self.handle = pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, df, sheet=None):
+        if self.columns is None or sheet != self.sheet:
+            self.open(df, sheet)
+        if self.kind == "parquet":
+            import pyarrow as pa
+            df = df.set_axis(self.columns, axis=1)
+            for field in self.schema:
+                if pa.types.is_string(field.type) and df[field.name].dtype != "string":
+                    df[field.name] = [None if pd.isna(v) else str(v) for v in df[field.name]]
+            self.handle.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+            return
+        for row in df.itertuples(index=False, name=None):
+            values = [None if pd.isna(v) else v for v in row]
+            if self.kind == "xlsx":
+                self.target.append(values)
+            else:
+                self.target.writerow(["" if v is None else v for v in values])
+        if self.kind == "csv":
+            self.handle.flush()
+
+    def close(self):
+        if self.handle is None:
+            return
+        if self.kind == "xlsx":
+            self.handle.save(self.path)
+        else:
+            self.handle.close()
+        self.handle = None
@@ -0,0 +1,344 @@
+"""OpenAI chat-completion summarizers (sync and concurrent asyncio) used by app_OPENAI.py and the command line"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from summary_cache import needs_summary
+
+# HTTP statuses worth retrying; anything else (bad request, auth) fails fast
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+def retry_delay(error, attempt, base=1.0, cap=60.0):
+    """Seconds to wait before the next attempt: Retry-After if sent, else exponential backoff with jitter"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            value = response.headers.get(header)
+            try:
+                return min(cap, float(value) * scale)
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def is_retryable(error):
+    import openai
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUSES
+
+# Packed requests: per-text markers and JSON key, and the most completion tokens one request may ask for
+PACK_ITEM_TOKENS = 12
+MAX_PACKED_COMPLETION = 4000
+# Prompt budget used when packing is switched on without a size
+DEFAULT_PACK_TOKENS = 3000
+
+def token_counter(model):
+    """Function counting the tokens of a string for `model`: tiktoken when it and its encoding
+    file are available, else an estimate of ~4 characters per token"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return lambda text: len(text) // 4 + 1
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` units per minute"""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class ChatGPTSummarizer:
+    def __init__(self, model="gpt-3.5-turbo", temperature=0.5, max_tokens=150):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.client = None
+
+    def cache_params(self, min_words=40, max_words=50):
+        """Settings that change the output, used in the summary cache key"""
+        return dict(min_words=min_words, max_words=max_words,
+                    temperature=self.temperature, max_tokens=self.max_tokens)
+
+    def build_messages(self, text, min_words=40, max_words=50):
+        prompt = (
+            f"|||NON-NEGOTIABLE INSTRUCTIONS|||\n"
+            f"Create a {min_words}-{max_words} word summary that:\n"
+            f"1. Is EXACTLY {max_words} words (ABSOLUTE LIMIT)\n"
+            f"2. Uses COMPLETE SENTENCES only\n"
+            f"3. Preserves ALL KEY INFORMATION from this 300+ word text:\n"
+            f"----------------\n"
+            f"{text}\n"
+            f"----------------\n"
+            f"FORMAT YOUR RESPONSE AS:\n"
+            f"[Your summary here]"
+        )
+        return [
+            {"role": "system", "content": "You are a ruthless summarization engine that never exceeds word limits."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def request_body(self, messages):
+        """Chat completion parameters, shared by the live calls and the Batch API request file"""
+        return dict(model=self.model, messages=messages, temperature=self.temperature, max_tokens=self.max_tokens)
+
+    def summarize(self, text, min_words=40, max_words=50, max_retries=3):
+        import openai
+        if self.client is None:
+            self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        messages = self.build_messages(text, min_words, max_words)
+        
+        for attempt in range(max_retries):
+            try:
+                response = self.client.chat.completions.create(**self.request_body(messages))
+                summary = response.choices[0].message.content.strip()
+                return summary
+            except Exception as e:
+                print(f"Error during summarization (attempt {attempt+1}): {e}")
+                if not is_retryable(e):
+                    break
+                time.sleep(retry_delay(e, attempt))
+        return "[SUMMARY FAILED]"
+
+class AsyncChatGPTSummarizer(ChatGPTSummarizer):
+    """Concurrent summarization over one pooled AsyncOpenAI client, kept under the account rate limits.
+
+    The client, the concurrency limit and the rate-limit buckets live on the summarizer's own
+    event loop, which lasts until close(), so every summarize_all call of a job shares them.
+
+    With pack_tokens, short texts share requests: up to `pack_items` texts are sent together as
+    long as the prompt stays within `pack_tokens` tokens, and the model answers with a JSON object
+    keyed by item id. Items missing or malformed in the answer are sent again on their own."""
+    def __init__(self, concurrency=8, requests_per_minute=500, tokens_per_minute=200000,
+                 pack_tokens=0, pack_items=16, **kwargs):
+        super().__init__(**kwargs)
+        self.concurrency = max(1, int(concurrency))
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.pack_tokens = pack_tokens
+        self.pack_items = max(1, pack_items)
+        self.count_tokens = None
+        self.loop = None
+        self.loop_lock = threading.Lock()
+        self.limits = None
+        self.async_client = None
+        # Requests, billed tokens and fallbacks over the summarizer's lifetime
+        self.usage = Counter()
+
+    def estimate_tokens(self, messages, completion_tokens=None):
+        # Rough prompt size (~4 characters per token) plus the completion budget
+        return sum(len(m["content"]) for m in messages) // 4 + (completion_tokens or self.max_tokens)
+
+    def record_usage(self, response, packed=False):
+        self.usage["packed_requests" if packed else "single_requests"] += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self.usage["completion_tokens"] += usage.completion_tokens or 0
+
+    def usage_stats(self):
+        texts = self.usage["texts"] or 1
+        requests = self.usage["single_requests"] + self.usage["packed_requests"]
+        tokens = self.usage["prompt_tokens"] + self.usage["completion_tokens"]
+        line = (f"OpenAI: {requests} requests for {self.usage['texts']} texts ({requests / texts:.2f} per text), "
+                f"{tokens} tokens ({tokens / texts:.0f} per text)")
+        if self.pack_tokens:
+            line += f", {self.usage['packed_requests']} packed, {self.usage['fallbacks']} texts re-sent alone"
+        return line
+
+    async def summarize_async(self, client, limits, text, min_words=40, max_words=50, max_retries=6):
+        semaphore, request_bucket, token_bucket = limits
+        messages = self.build_messages(text, min_words, max_words)
+        tokens = self.estimate_tokens(messages)
+        
+        async with semaphore:
+            for attempt in range(max_retries):
+                await request_bucket.acquire(1)
+                await token_bucket.acquire(tokens)
+                try:
+                    response = await client.chat.completions.create(**self.request_body(messages))
+                    self.record_usage(response)
+                    return response.choices[0].message.content.strip()
+                except Exception as e:
+                    print(f"Error during summarization (attempt {attempt+1}): {e}")
+                    if not is_retryable(e):
+                        break
+                    await asyncio.sleep(retry_delay(e, attempt))
+        return "[SUMMARY FAILED]"
+
+    def build_packed_messages(self, items, min_words=40, max_words=50):
+        """One prompt for several (id, text) items; the answer is a JSON object keyed by id"""
+        blocks = "\n".join(f"<<<ITEM {item_id}>>>\n{text}\n<<<END {item_id}>>>" for item_id, text in items)
+        prompt = (
+            f"|||NON-NEGOTIABLE INSTRUCTIONS|||\n"
+            f"Summarize EACH of the {len(items)} texts below separately. Every summary:\n"
+            f"1. Is {min_words}-{max_words} words (ABSOLUTE LIMIT: {max_words} words)\n"
+            f"2. Uses COMPLETE SENTENCES only\n"
+            f"3. Preserves ALL KEY INFORMATION from its own text, and nothing from the others\n"
+            f"RESPOND WITH ONLY THIS JSON, one entry per item id:\n"
+            f'{{"summaries": {{"<item id>": "<summary>"}}}}\n'
+            f"----------------\n"
+            f"{blocks}"
+        )
+        return [
+            {"role": "system", "content": "You are a ruthless summarization engine that never exceeds word limits."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def pack(self, texts, min_words=40, max_words=50):
+        """Split text positions into packs whose prompt fits in pack_tokens; a text too long
+        to share a request ends up in a pack of its own"""
+        if self.count_tokens is None:
+            self.count_tokens = token_counter(self.model)
+        overhead = sum(self.count_tokens(m["content"]) for m in self.build_packed_messages([], min_words, max_words))
+        packs, current, used = [], [], overhead
+        for i, text in enumerate(texts):
+            size = self.count_tokens(text) + PACK_ITEM_TOKENS
+            if current and (used + size > self.pack_tokens or len(current) >= self.pack_items):
+                packs.append(current)
+                current, used = [], overhead
+            current.append(i)
+            used += size
+        if current:
+            packs.append(current)
+        return packs
+
+    def parse_packed(self, content, ids, max_words=50):
+        """{id: summary} for the items answered properly: a non-empty string of a plausible length"""
+        content = re.sub(r"^```(?:json)?\s*|\s*```$", "", (content or "").strip())
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return {}
+        summaries = data.get("summaries", data) if isinstance(data, dict) else data
+        if isinstance(summaries, list):
+            summaries = {str(item.get("id")): item.get("summary") for item in summaries if isinstance(item, dict)}
+        if not isinstance(summaries, dict):
+            return {}
+        valid = {}
+        for item_id in ids:
+            summary = summaries.get(item_id)
+            # Far over the word limit usually means texts were merged into one summary
+            if isinstance(summary, str) and summary.strip() and len(summary.split()) <= 2 * max_words:
+                valid[item_id] = summary.strip()
+        return valid
+
+    async def summarize_packed(self, client, limits, items, min_words=40, max_words=50, max_retries=6):
+        """Summaries of a pack of (id, text) items, as {id: summary} for the items answered properly"""
+        semaphore, request_bucket, token_bucket = limits
+        messages = self.build_packed_messages(items, min_words, max_words)
+        body = self.request_body(messages)
+        body["max_tokens"] = min(MAX_PACKED_COMPLETION, self.max_tokens * len(items))
+        body["response_format"] = {"type": "json_object"}
+        tokens = self.estimate_tokens(messages, body["max_tokens"])
+        
+        async with semaphore:
+            for attempt in range(max_retries):
+                await request_bucket.acquire(1)
+                await token_bucket.acquire(tokens)
+                try:
+                    response = await client.chat.completions.create(**body)
+                    self.record_usage(response, packed=True)
+                    return self.parse_packed(response.choices[0].message.content,
+                                             [item_id for item_id, _ in items], max_words)
+                except Exception as e:
+                    print(f"Error during packed summarization (attempt {attempt+1}): {e}")
+                    if not is_retryable(e):
+                        break
+                    await asyncio.sleep(retry_delay(e, attempt))
+        return {}
+
+    def connect(self):
+        """Create the client and limits on first use; called on the summarizer's event loop"""
+        import httpx
+        import openai
+        if self.async_client is None:
+            self.limits = (
+                asyncio.Semaphore(self.concurrency),
+                TokenBucket(self.requests_per_minute),
+                TokenBucket(self.tokens_per_minute)
+            )
+            # One client for the summarizer's lifetime so HTTP connections are reused
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+            self.async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                                                   http_client=http_client)
+        return self.async_client, self.limits
+
+    def run(self, coroutine):
+        """Run a coroutine to completion on the summarizer's event loop"""
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+            return self.loop.run_until_complete(coroutine)
+
+    def close(self):
+        """Close the client's connections and the event loop"""
+        with self.loop_lock:
+            if self.loop is None:
+                return
+            if self.async_client is not None:
+                self.loop.run_until_complete(self.async_client.close())
+            self.loop.close()
+            self.loop, self.limits, self.async_client = None, None, None
+
+    async def summarize_many(self, texts, min_words=40, max_words=50, progress=None):
+        client, limits = self.connect()
+        
+        async def run(index, text):
+            summary = await self.summarize_async(client, limits, text, min_words, max_words)
+            if progress:
+                progress()
+            return index, summary
+        
+        async def run_pack(pack):
+            items = [(str(i), texts[i]) for i in pack]
+            answered = await self.summarize_packed(client, limits, items, min_words, max_words)
+            for i in pack:
+                if str(i) in answered and progress:
+                    progress()
+            # Items missing or malformed in the packed answer are sent again on their own
+            retry = [i for i in pack if str(i) not in answered]
+            self.usage["fallbacks"] += len(retry)
+            results = [(i, answered[str(i)]) for i in pack if str(i) in answered]
+            return results + list(await asyncio.gather(*(run(i, texts[i]) for i in retry)))
+        
+        if not self.pack_tokens:
+            return await asyncio.gather(*(run(i, text) for i, text in enumerate(texts)))
+        packs = self.pack(texts, min_words, max_words)
+        results = await asyncio.gather(*(run_pack(pack) if len(pack) > 1 else run(pack[0], texts[pack[0]])
+                                         for pack in packs))
+        return [pair for result in results for pair in (result if isinstance(result, list) else [result])]
+
+    def summarize_all(self, texts, min_words=40, max_words=50, progress=None):
+        """Summarize every text concurrently, returning results in the original row order"""
+        summaries = [""] * len(texts)
+        todo = [(i, str(text)) for i, text in enumerate(texts) if needs_summary(text)]
+        self.usage["texts"] += len(todo)
+        results = self.run(self.summarize_many([text for _, text in todo], min_words, max_words, progress))
+        for position, summary in results:
+            summaries[todo[position][0]] = summary
+        return summaries
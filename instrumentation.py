@@ -0,0 +1,182 @@
+"""Per-stage timers, counters, JSON-lines logs and sampled torch profiler traces.
+
+Cheap enough to leave on: a stage costs two perf_counter() calls and a dict update, and
+per-row log records are only built while logging. Pool workers keep their own Stats and
+send the deltas back with each chunk (see drain/merge)."""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 3)
+
+
+class Stats:
+    """Timers and counters for one run, shared by every stage that records into it.
+
+    log_path: append structured events (one JSON object per line) to this file.
+    trace_rows / trace_every / trace_dir: write a torch profiler trace for every
+    `trace_every`-th generate call, `trace_rows` traces at most per process."""
+    def __init__(self, log_path=None, trace_rows=0, trace_every=1, trace_dir="traces", buffer_events=False):
+        self.lock = threading.Lock()
+        self.trace_rows = trace_rows
+        self.trace_every = max(1, trace_every)
+        self.trace_dir = trace_dir
+        # Workers have no log file of their own: events are buffered and sent to the parent
+        self.buffer_events = buffer_events
+        self.log = None
+        self.reset()
+        if log_path:
+            self.open_log(log_path)
+
+    @property
+    def logging(self):
+        return self.log is not None or self.buffer_events
+
+    def reset(self):
+        with self.lock:
+            self.timers = {}
+            self.counters = Counter()
+            self.pending = []
+            self.trace_calls = 0
+            self.traces = 0
+            self.started = time.perf_counter()
+
+    def open_log(self, path):
+        self.close()
+        self.log = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def worker_config(self):
+        """Keyword arguments for the Stats of a pool worker. Workers buffer events only while this
+        Stats is logging; each task sends the current state along (see smart_summarizer)."""
+        return dict(trace_rows=self.trace_rows, trace_every=self.trace_every, trace_dir=self.trace_dir,
+                    buffer_events=self.logging)
+
+    def add_time(self, stage, seconds, calls=1):
+        with self.lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += calls
+            timer[1] += seconds
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def set_counters(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                if value is not None:
+                    self.counters[name] = value
+
+    def event(self, kind, **fields):
+        if not self.logging:
+            return
+        record = dict(time=round(time.time(), 3), event=kind, pid=os.getpid(), **fields)
+        with self.lock:
+            if self.log is not None:
+                self.log.write(json.dumps(record, default=str) + "\n")
+                self.log.flush()
+            else:
+                self.pending.append(record)
+
+    def error(self, stage, error):
+        """Count and log a caught exception (callers still print their console message)"""
+        self.count(f"{stage}_errors")
+        self.event("error", stage=stage, error=f"{type(error).__name__}: {error}"[:500])
+
+    def trace(self):
+        """Context manager around a generate call: a profiler trace on sampled calls, else nothing"""
+        if not self.trace_rows or self.traces >= self.trace_rows:
+            return nullcontext()
+        self.trace_calls += 1
+        if (self.trace_calls - 1) % self.trace_every:
+            return nullcontext()
+        self.traces += 1
+        return self.torch_trace(self.trace_calls)
+
+    @contextmanager
+    def torch_trace(self, call):
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        with profile(activities=activities, record_shapes=True) as profiler:
+            yield
+        os.makedirs(self.trace_dir, exist_ok=True)
+        path = os.path.join(self.trace_dir, f"generate-{os.getpid()}-{call}.json")
+        profiler.export_chrome_trace(path)
+        self.event("trace", path=path)
+
+    def drain(self):
+        """Timers, counters and buffered events since the last drain (worker side)"""
+        with self.lock:
+            snapshot = {"timers": self.timers, "counters": dict(self.counters), "events": self.pending}
+            self.timers, self.counters, self.pending = {}, Counter(), []
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a worker's drained snapshot (parent side)"""
+        for stage, (calls, seconds) in snapshot["timers"].items():
+            self.add_time(stage, seconds, calls)
+        with self.lock:
+            self.counters.update(snapshot["counters"])
+        for record in snapshot["events"]:
+            if self.log is not None:
+                with self.lock:
+                    self.log.write(json.dumps(record, default=str) + "\n")
+        if self.log is not None:
+            self.log.flush()
+
+    def add_job(self, job, cache=None):
+        """Copy a finished SummaryJob's row counts, the cache hit/miss counts and the duplicate
+        counts into the counters, and log the run summary"""
+        dedup = getattr(job, "dedup", None)
+        self.set_counters(job_rows=job.rows_done, job_skipped=job.rows_skipped, job_resumed=job.rows_resumed,
+                          job_failed=job.rows_failed, cache_hits=cache.hits if cache is not None else None,
+                          cache_misses=cache.misses if cache is not None else None,
+                          duplicates_exact=dedup.exact_duplicates if dedup is not None else None,
+                          duplicates_near=dedup.near_duplicates if dedup is not None else None)
+        self.event("run", **self.summary())
+
+    def summary(self):
+        with self.lock:
+            return {"elapsed": round(time.perf_counter() - self.started, 3),
+                    "stages": {stage: {"calls": calls, "seconds": round(seconds, 3)}
+                               for stage, (calls, seconds) in self.timers.items()},
+                    "counters": dict(self.counters)}
+
+    def table(self):
+        """Plain-text summary: time per stage (slowest first), then the counters"""
+        summary = self.summary()
+        stages = sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"])
+        total = sum(s["seconds"] for _, s in stages) or 1.0
+        lines = [f"{'Stage':<22}{'Calls':>8}{'Total s':>10}{'Mean ms':>10}{'Share':>8}"]
+        for stage, s in stages:
+            mean = 1000 * s["seconds"] / s["calls"] if s["calls"] else 0.0
+            lines.append(f"{stage:<22}{s['calls']:>8}{s['seconds']:>10.2f}{mean:>10.1f}"
+                         f"{100 * s['seconds'] / total:>7.1f}%")
+        lines.append(f"Wall time: {summary['elapsed']:.2f}s (stage times add up across worker processes)")
+        for name, value in sorted(summary["counters"].items()):
+            lines.append(f"{name:<22}{value:>8}")
+        return "\n".join(lines)
@@ -0,0 +1,127 @@
+"""Tk progress panel that runs a SummaryJob on a worker thread, so the window stays responsive"""
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+from summary_job import JobControl
+
+POLL_MS = 200
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+class JobPanel(tk.Frame):
+    """Progress bar with rows/sec, ETA, cache hits and failures, plus Pause/Cancel buttons.
+
+    The job only talks to the panel through a queue; the Tk side polls it with root.after."""
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.queue = queue.Queue()
+        self.control = None
+        self.thread = None
+        self.on_finish = None
+
+        self.progress_bar = ttk.Progressbar(self, mode="determinate", length=400)
+        self.progress_bar.pack(pady=(5, 0))
+        self.stats_label = tk.Label(self, text="", fg="gray25")
+        self.stats_label.pack()
+
+        buttons = tk.Frame(self)
+        buttons.pack(pady=5)
+        self.pause_button = tk.Button(buttons, text="Pause", width=8, command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", width=8, command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, job, on_finish):
+        """Run job on a worker thread; on_finish(job, error) is called on the Tk thread afterwards"""
+        self.control = JobControl()
+        self.on_finish = on_finish
+        self.progress_bar.config(mode="determinate", value=0)
+        self.stats_label.config(text="Starting...")
+        self.pause_button.config(text="Pause", state=tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL)
+
+        def work():
+            try:
+                job.run(progress=lambda snapshot: self.queue.put(("progress", snapshot)), control=self.control)
+                self.queue.put(("done", (job, None)))
+            except Exception as e:
+                self.queue.put(("done", (job, e)))
+
+        self.thread = threading.Thread(target=work, name="summary-job", daemon=True)
+        self.thread.start()
+        self.after(POLL_MS, self.poll)
+
+    def status(self, message):
+        """Show a message from any thread (e.g. "Loading model...")"""
+        self.queue.put(("status", message))
+
+    def toggle_pause(self):
+        if self.control.paused:
+            self.control.resume()
+            self.pause_button.config(text="Pause")
+        else:
+            self.control.pause()
+            self.pause_button.config(text="Resume")
+            self.stats_label.config(text=self.stats_label.cget("text") + "  (pausing after this batch)")
+
+    def cancel(self):
+        self.control.cancel()
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.stats_label.config(text="Cancelling after the current batch...")
+
+    def show_progress(self, snapshot):
+        done, total, elapsed = snapshot["rows_done"], snapshot["total_rows"], snapshot["elapsed"]
+        rate = snapshot["summarized"] / elapsed if elapsed > 0 else 0.0
+        parts = [f"{done:,}" + (f" / {total:,}" if total else "") + " rows"]
+        if total and done:
+            self.progress_bar.config(mode="determinate", maximum=total, value=min(done, total))
+            row_rate = done / elapsed if elapsed > 0 else 0.0
+            if row_rate > 0:
+                parts.append(f"ETA {format_duration((total - done) / row_rate)}")
+        else:
+            self.progress_bar.config(mode="indeterminate")
+            self.progress_bar.step(5)
+        parts.append(f"{rate:.1f} rows/s")
+        parts.append(f"cache hits {snapshot['cache_hits']:,}")
+        if snapshot.get("duplicates"):
+            parts.append(f"duplicates {snapshot['duplicates']:,}")
+        parts.append(f"failed {snapshot['failed']:,}")
+        self.stats_label.config(text="  ·  ".join(parts))
+
+    def poll(self):
+        latest, finished = None, None
+        while True:
+            try:
+                kind, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest = payload
+            elif kind == "status":
+                self.stats_label.config(text=payload)
+            else:
+                finished = payload
+        # Only the newest snapshot is drawn, however many batches finished since the last poll
+        if latest is not None:
+            self.show_progress(latest)
+
+        if finished is None:
+            self.after(POLL_MS, self.poll)
+            return
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        job, error = finished
+        if error is None:
+            self.show_progress(job.snapshot())
+        self.on_finish(job, error)
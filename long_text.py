@@ -0,0 +1,72 @@
+"""Hierarchical (map-reduce) summarization for documents longer than the model's 1024-token input"""
+from summary_cache import UNCACHEABLE
+
+def token_windows(tokenizer, text, window=1024, overlap=128):
+    """Split text into overlapping windows that each fit the model input"""
+    ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    usable = window - tokenizer.num_special_tokens_to_add()
+    if len(ids) <= usable:
+        return [text]
+
+    step = max(1, usable - overlap)
+    windows = []
+    for start in range(0, len(ids), step):
+        windows.append(tokenizer.decode(ids[start:start + usable], skip_special_tokens=True))
+        if start + usable >= len(ids):
+            break
+    return windows
+
+
+class MapReduceSummarizer:
+    """Summarizes long texts window by window, then summarizes the joined partial summaries
+    until the result fits in one window.
+
+    summarize_batch(texts, max_length=..., min_length=...) (lengths in words) is a batched engine such as
+    BatchSummarizer.summarize_all or ParallelSmartSummarizer.summarize_all: every window of
+    every document at one level goes through it in a single call."""
+    def __init__(self, tokenizer, summarize_batch, window=1024, overlap=128,
+                 cache=None, cache_tag=None, max_depth=5):
+        self.tokenizer = tokenizer
+        self.summarize_batch = summarize_batch
+        self.window = window
+        self.overlap = overlap
+        self.cache = cache
+        self.cache_tag = cache_tag or {}
+        self.max_depth = max_depth
+        self.windows_summarized = 0
+
+    def map_windows(self, windows, max_length, min_length):
+        if self.cache is None:
+            return self.summarize_batch(windows, max_length=max_length, min_length=min_length)
+        # Window summaries are cached too, so editing one chapter only re-runs its windows
+        tag = dict(self.cache_tag, window=self.window, overlap=self.overlap,
+                   max_words=max_length, min_words=min_length)
+        keys = [self.cache.key(w, "window", None, **tag) for w in windows]
+        return self.cache.summarize(
+            windows, keys, lambda todo: self.summarize_batch(todo, max_length=max_length, min_length=min_length)
+        )
+
+    def summarize_all(self, texts, max_length=200, min_length=100):
+        """Summarize every text in full, returning results in the original order"""
+        texts = [str(t) for t in texts]
+        # Partial summaries only need to carry content forward, not meet the final minimum
+        map_min_length = min(min_length, max_length // 2)
+
+        for depth in range(self.max_depth):
+            split = [token_windows(self.tokenizer, t, self.window, self.overlap) for t in texts]
+            long_docs = [i for i, windows in enumerate(split) if len(windows) > 1]
+            if not long_docs:
+                break
+
+            windows = [w for i in long_docs for w in split[i]]
+            partials = self.map_windows(windows, max_length, map_min_length)
+            self.windows_summarized += len(windows)
+
+            position = 0
+            for i in long_docs:
+                count = len(split[i])
+                texts[i] = " ".join(p for p in partials[position:position + count] if p not in UNCACHEABLE)
+                position += count
+
+        # Final pass: everything now fits in one window (or is truncated after max_depth levels)
+        return self.summarize_batch(texts, max_length=max_length, min_length=min_length)
@@ -0,0 +1,278 @@
+"""Local stand-in for the OpenAI chat completions, files and batches APIs, for testing without an account.
+
+    python mock_openai_server.py --port 8000 --latency 0.5 --rate-limit-every 20
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=test python app_OPENAI.py
+
+Batches finish `--batch-seconds` after they are created (checked when they are retrieved);
+with --batch-fail-every N every Nth request of a batch ends up in the error file.
+Packed prompts (several <<<ITEM id>>> blocks) are answered with a JSON object of summaries;
+with --pack-drop-every N every Nth item of a pack is left out, to exercise the fallback.
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, data):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length)
+
+    def read_json(self):
+        return json.loads(self.read_body() or b"{}")
+
+    def not_found(self):
+        self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self.chat_completion(self.read_json())
+        elif path.endswith("/files"):
+            self.upload_file()
+        elif path.endswith("/batches"):
+            self.create_batch(self.read_json())
+        elif path.endswith("/cancel") and "/batches/" in path:
+            self.read_body()
+            self.cancel_batch(path.split("/")[-2])
+        else:
+            self.not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if "/files/" in path and path.endswith("/content"):
+            stored = self.server.files.get(path.split("/")[-2])
+            if stored is None:
+                self.not_found()
+            else:
+                self.send_bytes(stored["data"])
+        elif "/batches/" in path:
+            batch = self.server.batch(path.split("/")[-1])
+            if batch is None:
+                self.not_found()
+            else:
+                self.send_json(200, batch)
+        else:
+            self.not_found()
+
+    def upload_file(self):
+        """multipart/form-data upload with `file` and `purpose` fields"""
+        body = self.read_body()
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        form = BytesParser(policy=default_policy).parsebytes(header + body)
+        fields = {part.get_param("name", header="content-disposition"): part for part in form.iter_parts()}
+        if "file" not in fields:
+            self.send_json(400, {"error": {"message": "Missing file"}})
+            return
+        purpose = fields["purpose"].get_payload(decode=True).decode("utf-8") if "purpose" in fields else "batch"
+        stored = self.server.store_file(fields["file"].get_payload(decode=True),
+                                        fields["file"].get_filename() or "upload.jsonl", purpose)
+        self.send_json(200, stored["object"])
+
+    def create_batch(self, request):
+        if request.get("input_file_id") not in self.server.files:
+            self.send_json(400, {"error": {"message": f"No such file: {request.get('input_file_id')}"}})
+            return
+        with self.server.lock:
+            batch_id = f"batch_mock_{next(self.server.ids)}"
+            self.server.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint", "/v1/chat/completions"),
+                "input_file_id": request["input_file_id"],
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "validating",
+                "created_at": int(time.time()),
+                "ready_at": time.monotonic() + self.server.batch_seconds,
+                "output_file_id": None,
+                "error_file_id": None,
+                "errors": None,
+                "metadata": request.get("metadata"),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+        self.send_json(200, self.server.batch(batch_id))
+
+    def cancel_batch(self, batch_id):
+        with self.server.lock:
+            batch = self.server.batches.get(batch_id)
+            if batch is not None and batch["status"] in ("validating", "in_progress"):
+                batch["status"] = "cancelled"
+        batch = self.server.batch(batch_id)
+        if batch is None:
+            self.not_found()
+        else:
+            self.send_json(200, batch)
+
+    def chat_completion(self, request):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        if server.rate_limit_every and count % server.rate_limit_every == 0:
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                           headers={"Retry-After": str(server.retry_after)})
+            return
+
+        time.sleep(server.latency)
+        self.send_json(200, mock_completion(request, server.pack_drop_every))
+
+
+PACKED_ITEM = re.compile(r"<<<ITEM (.+?)>>>\n(.*?)\n<<<END \1>>>", re.S)
+
+
+def mock_completion(request, pack_drop_every=0):
+    """Echo the first words of the text as the 'summary', or of each item of a packed prompt"""
+    prompt = request["messages"][-1]["content"]
+    items = PACKED_ITEM.findall(prompt)
+    if items:
+        summaries = {item_id: " ".join(text.split()[:40]) for number, (item_id, text) in enumerate(items, start=1)
+                     if not (pack_drop_every and number % pack_drop_every == 0)}
+        content = json.dumps({"summaries": summaries})
+    else:
+        parts = prompt.split("----------------")
+        text = parts[1] if len(parts) > 2 else prompt
+        content = " ".join(text.split()[:40])
+    prompt_tokens = sum(len(m["content"]) for m in request["messages"]) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def run_batch(server, batch):
+    """Answer every request of a batch's input file, writing the output and error files"""
+    outputs, errors = [], []
+    lines = server.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines()
+    for number, line in enumerate((line for line in lines if line.strip()), start=1):
+        request = json.loads(line)
+        result = {"id": f"batch_req_{number}", "custom_id": request["custom_id"], "error": None}
+        if server.batch_fail_every and number % server.batch_fail_every == 0:
+            result["response"] = {"status_code": 500, "request_id": f"req_{number}",
+                                  "body": {"error": {"message": "Mock server error", "type": "server_error"}}}
+            errors.append(result)
+        else:
+            result["response"] = {"status_code": 200, "request_id": f"req_{number}",
+                                  "body": mock_completion(request["body"])}
+            outputs.append(result)
+    for key, results in (("output_file_id", outputs), ("error_file_id", errors)):
+        if results:
+            data = "".join(json.dumps(r) + "\n" for r in results).encode("utf-8")
+            batch[key] = server.store_file(data, f"{batch['id']}_{key[:-8]}.jsonl", "batch_output")["object"]["id"]
+    batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open dozens of connections at once; the default listen backlog of 5 resets them
+    request_queue_size = 128
+
+
+def make_server(host="127.0.0.1", port=8000, latency=0.0, rate_limit_every=0, retry_after=1.0,
+                batch_seconds=0.0, batch_fail_every=0, pack_drop_every=0):
+    server = MockOpenAIServer((host, port), MockOpenAIHandler)
+    server.latency = latency
+    server.rate_limit_every = rate_limit_every
+    server.retry_after = retry_after
+    server.batch_seconds = batch_seconds
+    server.batch_fail_every = batch_fail_every
+    server.pack_drop_every = pack_drop_every
+    server.request_count = 0
+    server.lock = threading.RLock()
+    server.ids = itertools.count(1)
+    server.files = {}
+    server.batches = {}
+
+    def store_file(data, filename, purpose):
+        with server.lock:
+            file_id = f"file-mock-{next(server.ids)}"
+            server.files[file_id] = {"data": data, "object": {
+                "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}}
+            return server.files[file_id]
+
+    def batch(batch_id):
+        """Current state of a batch, finishing it once its time is up"""
+        with server.lock:
+            current = server.batches.get(batch_id)
+            if current is None:
+                return None
+            if current["status"] == "validating":
+                current["status"] = "in_progress"
+            elif current["status"] == "in_progress" and time.monotonic() >= current["ready_at"]:
+                run_batch(server, current)
+            return {k: v for k, v in current.items() if k != "ready_at"}
+
+    server.store_file = store_file
+    server.batch = batch
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a server on a background thread; returns (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--batch-seconds", type=float, default=5.0, help="Seconds until a submitted batch completes")
+    parser.add_argument("--batch-fail-every", type=int, default=0,
+                        help="Put every Nth request of a batch in the error file")
+    parser.add_argument("--pack-drop-every", type=int, default=0,
+                        help="Leave every Nth item of a packed request out of the answer")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.rate_limit_every, args.retry_after,
+                         args.batch_seconds, args.batch_fail_every, args.pack_drop_every)
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
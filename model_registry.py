@@ -0,0 +1,152 @@
+"""Process-wide model registry: every model is loaded once and shared by all summarizers.
+
+KeyBERT is built on the same SentenceTransformer instance the relevance scorer uses, and
+the app.py pipeline wraps the same BART weights as SmartSummarizer. Loading can start in a
+background thread (warm_up) while the user is still picking a file.
+
+BART can run on three runtimes: "torch" (fp32, GPU when available), "int8" (PyTorch dynamic
+quantization of the Linear layers) and "onnx" (ONNX Runtime encoder-decoder with KV cache,
+exported once to ONNX_DIR). The last two are CPU-only."""
+import os
+import threading
+from functools import partial
+
+BART_MODEL = 'facebook/bart-large-cnn'
+SENTENCE_MODEL = 'all-MiniLM-L6-v2'
+RUNTIMES = ("torch", "int8", "onnx")
+ONNX_DIR = os.environ.get("SUMMARY_ONNX_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "smart_summarizer", "onnx"))
+
+_models = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _get(name, loader):
+    if name in _models:
+        return _models[name]
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    # Per-model lock: a second caller waits for the load in progress instead of loading again
+    with lock:
+        if name not in _models:
+            _models[name] = loader()
+    return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def device():
+    import torch
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def runtime_tag(runtime="torch"):
+    """Extra cache-key settings for a runtime; empty for torch so existing cache entries stay valid"""
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown runtime '{runtime}', expected one of {', '.join(RUNTIMES)}")
+    return {} if runtime == "torch" else {"runtime": runtime}
+
+
+def model_key(prefix, name, runtime):
+    return f"{prefix}:{name}" if runtime == "torch" else f"{prefix}:{name}:{runtime}"
+
+
+def sentence_model(name=SENTENCE_MODEL):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    return _get(f"sentence:{name}", load)
+
+
+def keyword_model():
+    def load():
+        from keybert import KeyBERT
+        # Share the relevance scorer's encoder instead of loading a second MiniLM copy
+        return KeyBERT(model=sentence_model())
+    return _get("keybert", load)
+
+
+def bart_tokenizer(name=BART_MODEL):
+    def load():
+        from transformers import BartTokenizer
+        return BartTokenizer.from_pretrained(name)
+    return _get(f"tokenizer:{name}", load)
+
+
+def onnx_path(name=BART_MODEL):
+    return os.path.join(ONNX_DIR, name.replace("/", "--"))
+
+
+def export_onnx(name=BART_MODEL, force=False):
+    """One-time ONNX export of the encoder and decoder (with KV cache); later calls reuse the files"""
+    path = onnx_path(name)
+    if force or not os.path.exists(os.path.join(path, "config.json")):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        print(f"Exporting {name} to ONNX in {path} (one time only)...")
+        model = ORTModelForSeq2SeqLM.from_pretrained(name, export=True, use_cache=True)
+        model.save_pretrained(path)
+        bart_tokenizer(name).save_pretrained(path)
+    return path
+
+
+def bart_model(name=BART_MODEL, runtime="torch"):
+    def load():
+        import torch
+        from transformers import BartForConditionalGeneration
+        if runtime == "torch":
+            return BartForConditionalGeneration.from_pretrained(name).to(device()).eval()
+        if runtime == "int8":
+            # Fresh CPU copy: quantizing the shared fp32 model would change it for every user
+            model = BartForConditionalGeneration.from_pretrained(name).eval()
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        options = onnxruntime.SessionOptions()
+        # Follow torch's thread setting so pool workers still split the cores between them
+        options.intra_op_num_threads = torch.get_num_threads()
+        return ORTModelForSeq2SeqLM.from_pretrained(export_onnx(name), use_cache=True, session_options=options,
+                                                    provider="CPUExecutionProvider")
+    runtime_tag(runtime)
+    return _get(model_key("bart", name, runtime), load)
+
+
+def summarization_pipeline(name=BART_MODEL, runtime="torch"):
+    def load():
+        import torch
+        from transformers import pipeline
+        return pipeline(
+            "summarization",
+            model=bart_model(name, runtime),
+            tokenizer=bart_tokenizer(name),
+            device=0 if runtime == "torch" and torch.cuda.is_available() else -1,
+            truncation=True
+        )
+    return _get(model_key("pipeline", name, runtime), load)
+
+
+def backend_models(backend, runtime="torch"):
+    """What each backend needs, in load order"""
+    if backend == "bart":
+        return [bart_tokenizer, partial(bart_model, runtime=runtime), partial(summarization_pipeline, runtime=runtime)]
+    return [sentence_model, keyword_model, bart_tokenizer, partial(bart_model, runtime=runtime)]
+
+
+def warm_up(backend, on_done=None, runtime="torch"):
+    """Load a backend's models in a daemon thread; on_done(error or None) is called when finished"""
+    def run():
+        error = None
+        try:
+            for loader in backend_models(backend, runtime):
+                loader()
+        except Exception as e:
+            error = e
+            print(f"Model warm-up failed: {e}")
+        if on_done:
+            on_done(error)
+
+    thread = threading.Thread(target=run, name=f"warm-up-{backend}", daemon=True)
+    thread.start()
+    return thread
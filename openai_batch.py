@@ -0,0 +1,311 @@
+"""OpenAI Batch API mode for large, non-urgent jobs (about half the price of live requests).
+
+    python openai_batch.py submit --input books.xlsx --column Preface --output books_summarized.xlsx
+    python openai_batch.py status --output books_summarized.xlsx
+    python openai_batch.py collect --output books_summarized.xlsx
+
+`submit` writes one chat completion request per distinct text (built with the same prompt
+as the live path) to JSONL files, uploads them and creates the batches, then exits. The
+batch ids and settings are kept in <output>.batch.json, so no process has to stay alive
+while OpenAI works: run `collect` later, by hand or from cron. It exits with code 2 while
+batches are still running and writes the output file once they have finished. Each
+request's custom_id is the row's cache key, so results are joined back to every row with
+that text. Rows whose request failed or expired are summarized through the normal live path.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Batch API limits per input file
+MAX_REQUESTS_PER_BATCH = 50000
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024
+ENDPOINT = "/v1/chat/completions"
+# Batches in these states will not change any more
+FINISHED = {"completed", "failed", "expired", "cancelled"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a column through the OpenAI Batch API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="Write, upload and submit the batch requests")
+    submit_parser.add_argument("--input", required=True, help="Input .xlsx, .xls, .csv or .parquet file")
+    submit_parser.add_argument("--column", required=True, help="Column containing the texts to summarize")
+    submit_parser.add_argument("--min-words", type=int, default=40, help="Minimum summary length")
+    submit_parser.add_argument("--max-words", type=int, default=50, help="Maximum summary length")
+    submit_parser.add_argument("--model", default="gpt-3.5-turbo", help="Chat model")
+    submit_parser.add_argument("--summary-column", default="Catalogue Summary", help="Name of the added column")
+    submit_parser.add_argument("--chunksize", type=int, default=1000, help="Rows read per chunk")
+
+    status_parser = commands.add_parser("status", help="Show the progress of submitted batches")
+    collect_parser = commands.add_parser("collect", help="Write the output once the batches have finished")
+    collect_parser.add_argument("--wait", action="store_true", help="Poll until the batches finish instead of exiting")
+    collect_parser.add_argument("--poll-seconds", type=float, default=60, help="Seconds between polls with --wait")
+    collect_parser.add_argument("--concurrency", type=int, default=8, help="Parallel live requests for failed rows")
+    cancel_parser = commands.add_parser("cancel", help="Cancel submitted batches that have not finished")
+
+    for command in (submit_parser, status_parser, collect_parser, cancel_parser):
+        command.add_argument("--output", required=True, help="Output .xlsx, .csv or .parquet file")
+        command.add_argument("--state", help="Batch state file (default: <output>.batch.json)")
+    for command in (submit_parser, collect_parser):
+        command.add_argument("--no-cache", action="store_true", help="Do not read or write the summary cache")
+        command.add_argument("--cache-path", help="Cache database (default: ~/.cache/smart_summarizer/summaries.sqlite)")
+
+    args = parser.parse_args(argv)
+    if not args.state:
+        args.state = args.output + ".batch.json"
+    return args
+
+
+def load_state(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"No submitted batches found ({path} does not exist): run submit first")
+
+
+def save_state(path, state):
+    # Write to a temporary file first so an interrupted save never loses the batch ids
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def make_summarizer(state, concurrency=8):
+    from gpt_summarizer import AsyncChatGPTSummarizer
+    return AsyncChatGPTSummarizer(concurrency=concurrency, model=state["model"],
+                                  temperature=state["temperature"], max_tokens=state["max_tokens"])
+
+
+def make_client():
+    import dotenv
+    import openai
+    dotenv.load_dotenv()
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def open_cache(args):
+    from summary_cache import SummaryCache
+    return None if args.no_cache else SummaryCache(path=args.cache_path)
+
+
+def request_files(args, state, summarizer, cache):
+    """Write the JSONL request files; yields (path, number of requests) for each full file"""
+    from excel_io import iter_chunks
+    from summary_cache import cache_key, needs_summary
+
+    params = summarizer.cache_params(state["min_words"], state["max_words"])
+    seen = set()
+    part, handle, requests, size = 0, None, 0, 0
+    for chunk in iter_chunks(args.input, args.chunksize):
+        if args.column not in chunk.columns:
+            raise KeyError(f"Column '{args.column}' not found in {args.input}")
+        texts = [text for text in chunk[args.column] if needs_summary(text)]
+        keys = [cache_key(text, "openai", summarizer.model, **params) for text in texts]
+        cached = cache.get_many(keys) if cache is not None else {}
+        for text, key in zip(texts, keys):
+            # Identical texts share a key: one request serves all of them
+            if key in seen or key in cached:
+                continue
+            seen.add(key)
+            messages = summarizer.build_messages(str(text), state["min_words"], state["max_words"])
+            line = json.dumps({"custom_id": key, "method": "POST", "url": ENDPOINT,
+                               "body": summarizer.request_body(messages)}, ensure_ascii=False) + "\n"
+            if handle is not None and (requests >= MAX_REQUESTS_PER_BATCH
+                                       or size + len(line.encode("utf-8")) > MAX_BYTES_PER_BATCH):
+                handle.close()
+                yield handle.name, requests
+                handle = None
+            if handle is None:
+                part += 1
+                handle = open(f"{args.state}.part{part}.jsonl", "w", encoding="utf-8")
+                requests, size = 0, 0
+            handle.write(line)
+            requests += 1
+            size += len(line.encode("utf-8"))
+    if handle is not None:
+        handle.close()
+        yield handle.name, requests
+
+
+def submit(args):
+    if os.path.exists(args.state):
+        print(f"Batches were already submitted for this output ({args.state}): "
+              f"collect or cancel them first", file=sys.stderr)
+        return 1
+
+    from gpt_summarizer import AsyncChatGPTSummarizer
+    template = AsyncChatGPTSummarizer(model=args.model)
+    state = {"input": os.path.abspath(args.input), "column": args.column, "output": os.path.abspath(args.output),
+             "summary_column": args.summary_column, "model": args.model, "min_words": args.min_words,
+             "max_words": args.max_words, "temperature": template.temperature, "max_tokens": template.max_tokens,
+             "submitted": time.strftime("%Y-%m-%d %H:%M:%S"), "batches": []}
+    summarizer = make_summarizer(state)
+    client = make_client()
+    cache = open_cache(args)
+    try:
+        for path, requests in request_files(args, state, summarizer, cache):
+            try:
+                with open(path, "rb") as f:
+                    uploaded = client.files.create(file=f, purpose="batch")
+                batch = client.batches.create(input_file_id=uploaded.id, endpoint=ENDPOINT, completion_window="24h",
+                                              metadata={"source": os.path.basename(args.input)})
+            finally:
+                os.remove(path)
+            state["batches"].append({"id": batch.id, "input_file_id": uploaded.id, "requests": requests,
+                                     "status": batch.status})
+            # Saved after every batch, so a failed submit can still be collected or cancelled
+            save_state(args.state, state)
+            print(f"Submitted {batch.id} with {requests} requests", file=sys.stderr)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if not state["batches"]:
+        print("Nothing to submit: every row is empty or already cached. Run collect to write the output.",
+              file=sys.stderr)
+        save_state(args.state, state)
+        return 0
+    total = sum(b["requests"] for b in state["batches"])
+    print(f"Submitted {total} requests in {len(state['batches'])} batch(es). "
+          f"Run 'python openai_batch.py collect --output {args.output}' later.", file=sys.stderr)
+    return 0
+
+
+def refresh(client, state):
+    """Update the status of each batch from the API; True once they have all finished"""
+    for entry in state["batches"]:
+        if entry["status"] in FINISHED:
+            continue
+        batch = client.batches.retrieve(entry["id"])
+        entry["status"] = batch.status
+        entry["output_file_id"] = batch.output_file_id
+        entry["error_file_id"] = batch.error_file_id
+        counts = batch.request_counts
+        if counts is not None:
+            entry["completed"], entry["failed"] = counts.completed, counts.failed
+    return all(entry["status"] in FINISHED for entry in state["batches"])
+
+
+def print_status(state):
+    for entry in state["batches"]:
+        done = entry.get("completed", 0) + entry.get("failed", 0)
+        print(f"{entry['id']}: {entry['status']}, {done}/{entry['requests']} requests done, "
+              f"{entry.get('failed', 0)} failed", file=sys.stderr)
+
+
+def status(args):
+    state = load_state(args.state)
+    finished = refresh(make_client(), state)
+    save_state(args.state, state)
+    print_status(state)
+    return 0 if finished else 2
+
+
+def cancel(args):
+    state = load_state(args.state)
+    client = make_client()
+    refresh(client, state)
+    for entry in state["batches"]:
+        if entry["status"] not in FINISHED:
+            entry["status"] = client.batches.cancel(entry["id"]).status
+    save_state(args.state, state)
+    print_status(state)
+    print(f"Run collect to summarize the remaining rows live, or delete {args.state} to submit again",
+          file=sys.stderr)
+    return 0
+
+
+def download_results(client, state):
+    """{custom_id: summary} for every request that succeeded; everything else is retried live"""
+    results = {}
+    for entry in state["batches"]:
+        if not entry.get("output_file_id"):
+            continue
+        content = client.files.content(entry["output_file_id"])
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                continue
+            try:
+                summary = response["body"]["choices"][0]["message"]["content"].strip()
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if summary:
+                results[record["custom_id"]] = summary
+    return results
+
+
+def collect(args):
+    from checkpoint import JobCheckpoint
+    from summary_cache import cache_key, needs_summary
+    from summary_job import SummaryJob
+
+    state = load_state(args.state)
+    client = make_client()
+    while not refresh(client, state):
+        save_state(args.state, state)
+        if not args.wait:
+            print_status(state)
+            print("Batches are still running: run collect again later", file=sys.stderr)
+            return 2
+        time.sleep(args.poll_seconds)
+    save_state(args.state, state)
+    print_status(state)
+
+    results = download_results(client, state)
+    summarizer = make_summarizer(state, args.concurrency)
+    params = summarizer.cache_params(state["min_words"], state["max_words"])
+    retried = []
+
+    def key_for(text):
+        return cache_key(text, "openai", summarizer.model, **params) if needs_summary(text) else None
+
+    def summarize_missing(texts):
+        summaries = [results.get(key_for(text)) for text in texts]
+        # Requests that failed, expired or were cancelled go through the normal live path
+        retry = [i for i, summary in enumerate(summaries) if summary is None]
+        if retry:
+            retried.extend(retry)
+            live = summarizer.summarize_all([texts[i] for i in retry], min_words=state["min_words"],
+                                            max_words=state["max_words"])
+            for i, summary in zip(retry, live):
+                summaries[i] = summary
+        return summaries
+
+    def progress(snapshot):
+        total = snapshot["total_rows"]
+        print(f"Processed {snapshot['rows_done']}" + (f"/{total}" if total else "") + " rows", file=sys.stderr)
+
+    cache = open_cache(args)
+    checkpoint = JobCheckpoint(state["output"])
+    job = SummaryJob(state["input"], state["column"], state["output"], summarize_missing, key_for,
+                     cache=cache, checkpoint=checkpoint, summary_column=state["summary_column"])
+    try:
+        rows = job.run(progress=progress)
+    finally:
+        summarizer.close()
+        if cache is not None:
+            cache.close()
+
+    print(f"Wrote {rows} rows to {state['output']}: {len(results)} batch results, "
+          f"{len(retried)} rows retried live, {job.rows_failed} failed", file=sys.stderr)
+    os.remove(args.state)
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    commands = {"submit": submit, "status": status, "collect": collect, "cancel": cancel}
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
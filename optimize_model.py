@@ -0,0 +1,186 @@
+"""Cost/quality tools for BART: optimized CPU runtimes and decoding profiles.
+
+    python optimize_model.py export
+    python optimize_model.py compare --input books.xlsx --column Preface --runtime int8 --sample 50
+    python optimize_model.py profiles --input books.xlsx --column Preface --sample 50
+
+`compare` summarizes the same sample with the fp32 torch model and with the chosen runtime,
+then reports the speedup and the ROUGE of the optimized output against the fp32 output.
+With --min-rouge-l the exit code is 1 when the quality cost is above what you accept.
+`profiles` runs the sample through each decoding profile and reports latency, summary
+length and ROUGE against the quality profile."""
+import argparse
+import json
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cost/quality checks for BART runtimes and decoding profiles.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export BART to ONNX once (reused by --runtime onnx)")
+    export.add_argument("--force", action="store_true", help="Export again even if the files exist")
+
+    compare = commands.add_parser("compare", help="Measure speed and ROUGE of a runtime against fp32")
+    add_sample_args(compare)
+    compare.add_argument("--runtime", choices=("int8", "onnx"), required=True, help="Runtime to check")
+    compare.add_argument("--profile", choices=("fast", "balanced", "quality"), default="balanced",
+                         help="Decoding profile used for both runs")
+    compare.add_argument("--min-rouge-l", type=float, help="Fail if mean ROUGE-L F1 is below this")
+
+    profiles = commands.add_parser("profiles", help="Measure latency and summary length of each decoding profile")
+    add_sample_args(profiles)
+    profiles.add_argument("--runtime", choices=("torch", "int8", "onnx"), default="torch", help="Runtime to use")
+    return parser.parse_args(argv)
+
+
+def add_sample_args(parser):
+    parser.add_argument("--input", required=True, help="Input .xlsx, .xls, .csv or .parquet file")
+    parser.add_argument("--column", required=True, help="Column containing the texts to summarize")
+    parser.add_argument("--backend", choices=("bart", "smart"), default="bart",
+                        help="bart (app.py) or smart (app_BART.py)")
+    parser.add_argument("--sample", type=int, default=50, help="Rows to summarize in each run")
+    parser.add_argument("--min-words", type=int, default=100, help="Minimum summary length")
+    parser.add_argument("--max-words", type=int, default=200, help="Maximum summary length")
+    parser.add_argument("--batch-size", type=int, default=8, help="bart: rows per forward pass")
+    parser.add_argument("--json", help="Also write the report to this file")
+
+
+def load_sample(path, column, size):
+    """First `size` rows of `column` that would be sent to the model"""
+    from excel_io import iter_chunks
+    from summary_cache import needs_summary
+    texts = []
+    for chunk in iter_chunks(path):
+        if column not in chunk.columns:
+            raise KeyError(f"Column '{column}' not found in {path}")
+        texts.extend(str(text) for text in chunk[column] if needs_summary(text))
+        if len(texts) >= size:
+            break
+    return texts[:size]
+
+
+def load_engine(backend, runtime, batch_size, profile):
+    if backend == "bart":
+        from bart_summarizer import BatchSummarizer, load_pipeline
+        return BatchSummarizer(load_pipeline(runtime=runtime), batch_size=batch_size, profile=profile)
+    from smart_summarizer import ParallelSmartSummarizer
+    return ParallelSmartSummarizer(workers=1, runtime=runtime, profile=profile)
+
+
+def timed_run(args, runtime, profile, texts):
+    start = time.perf_counter()
+    engine = load_engine(args.backend, runtime, args.batch_size, profile)
+    loaded = time.perf_counter()
+    summaries = engine.summarize_all(texts, max_length=args.max_words, min_length=args.min_words)
+    done = time.perf_counter()
+    return summaries, {"load_seconds": round(loaded - start, 2), "seconds": round(done - loaded, 2),
+                       "rows_per_second": round(len(texts) / (done - loaded), 3) if done > loaded else None}
+
+
+def length_stats(summaries):
+    """Mean and 95th percentile summary length in words"""
+    words = sorted(len(s.split()) for s in summaries if s and s != "[SUMMARY FAILED]")
+    if not words:
+        return {"mean_words": None, "p95_words": None}
+    return {"mean_words": round(sum(words) / len(words), 1),
+            "p95_words": words[min(len(words) - 1, int(len(words) * 0.95))]}
+
+
+def write_report(args, report):
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def sample_for(args):
+    return load_sample(args.input, args.column, args.sample)
+
+
+def rouge(references, candidates):
+    """Mean ROUGE-1/2/L F1 of candidates against references, skipping failed rows"""
+    from rouge_score import rouge_scorer
+    scorer = rouge_scorer.RougeScorer(["rouge1", "rouge2", "rougeL"], use_stemmer=True)
+    totals = {"rouge1": 0.0, "rouge2": 0.0, "rougeL": 0.0}
+    pairs = [(r, c) for r, c in zip(references, candidates)
+             if r and c and "[SUMMARY FAILED]" not in (r, c)]
+    for reference, candidate in pairs:
+        for name, score in scorer.score(reference, candidate).items():
+            totals[name] += score.fmeasure
+    return {name: round(total / len(pairs), 4) if pairs else None for name, total in totals.items()}
+
+
+def compare(args):
+    import warnings
+    import model_registry
+    warnings.filterwarnings("ignore")
+
+    texts = sample_for(args)
+    if not texts:
+        print("No rows to summarize in the sample", file=sys.stderr)
+        return 1
+
+    print(f"Summarizing {len(texts)} rows with torch (fp32) on {model_registry.device()}...", file=sys.stderr)
+    reference, baseline = timed_run(args, "torch", args.profile, texts)
+    print(f"Summarizing {len(texts)} rows with {args.runtime}...", file=sys.stderr)
+    candidate, optimized = timed_run(args, args.runtime, args.profile, texts)
+
+    report = {
+        "backend": args.backend,
+        "runtime": args.runtime,
+        "profile": args.profile,
+        "rows": len(texts),
+        "torch": baseline,
+        args.runtime: optimized,
+        "speedup": round(baseline["seconds"] / optimized["seconds"], 2) if optimized["seconds"] else None,
+        "identical_rows": sum(r == c for r, c in zip(reference, candidate)),
+        "rouge_vs_fp32": rouge(reference, candidate),
+    }
+    write_report(args, report)
+
+    rouge_l = report["rouge_vs_fp32"]["rougeL"]
+    if args.min_rouge_l is not None and (rouge_l is None or rouge_l < args.min_rouge_l):
+        print(f"ROUGE-L {rouge_l} is below {args.min_rouge_l}: keep the torch runtime", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare_profiles(args):
+    import warnings
+    from decoding import PROFILES
+    warnings.filterwarnings("ignore")
+
+    texts = sample_for(args)
+    if not texts:
+        print("No rows to summarize in the sample", file=sys.stderr)
+        return 1
+
+    # Load the models once up front so the first profile's timing doesn't include it
+    load_engine(args.backend, args.runtime, args.batch_size, "fast")
+    outputs, report = {}, {"backend": args.backend, "runtime": args.runtime, "rows": len(texts), "profiles": {}}
+    for profile in PROFILES:
+        print(f"Summarizing {len(texts)} rows with the {profile} profile...", file=sys.stderr)
+        outputs[profile], timing = timed_run(args, args.runtime, profile, texts)
+        timing.pop("load_seconds")
+        report["profiles"][profile] = dict(timing, **length_stats(outputs[profile]))
+    for profile in PROFILES:
+        report["profiles"][profile]["rouge_vs_quality"] = rouge(outputs["quality"], outputs[profile])
+    write_report(args, report)
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "export":
+        import model_registry
+        print(model_registry.export_onnx(force=args.force))
+        return 0
+    if args.command == "profiles":
+        return compare_profiles(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Cost-aware routing: easy rows get a cheap extractive summary, the rest go to the model.
+
+A row is easy when it is short (at most `route_words` words, which must exceed the summary
+length) and made of plain sentences (at most `max_sentence_words` words on average), so
+picking its most central sentences reads well. Like the model, the extractive engine keeps a
+summary within the summary length and below MAX_OUTPUT_RATIO of the text. It is TextRank over
+MiniLM sentence embeddings (the registry's shared encoder): all sentences of a batch are
+encoded in one call, and each row is ranked with a few NumPy matrix-vector products.
+Extractive summaries have their own cache key, so switching routing off never serves them
+in place of model summaries."""
+import re
+import time
+import numpy as np
+import model_registry
+from decoding import MAX_OUTPUT_RATIO
+from summary_cache import cache_key
+
+DEFAULT_ROUTE_WORDS = 150
+# Without an explicit limit, texts up to this many times the summary length are routed
+ROUTE_SUMMARY_RATIO = 1.5
+DEFAULT_SENTENCE_WORDS = 25
+# TextRank damping factor and power-iteration limits
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+
+
+def split_sentences(text):
+    """Sentences with their final punctuation, so selected ones can be joined back as they were"""
+    return [s for s in re.split(r"(?<=[.!?])\s+", " ".join(str(text).split())) if s]
+
+
+def default_route_words(summary_words):
+    return max(DEFAULT_ROUTE_WORDS, int(ROUTE_SUMMARY_RATIO * summary_words))
+
+
+def extract_words(words, max_words):
+    """Length of an extractive summary: max_words, but never more than MAX_OUTPUT_RATIO of the text"""
+    return max(1, min(max_words, int(words * MAX_OUTPUT_RATIO)))
+
+
+def textrank(embeddings):
+    """Centrality of each sentence: PageRank over the cosine similarity graph of its embeddings"""
+    similarity = np.clip(embeddings @ embeddings.T, 0, None)
+    np.fill_diagonal(similarity, 0)
+    totals = similarity.sum(axis=0)
+    transition = np.divide(similarity, totals, out=np.zeros_like(similarity), where=totals > 0)
+    n = len(embeddings)
+    scores = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * transition @ scores
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+
+class ExtractiveSummarizer:
+    """Summaries made of each text's most central sentences, in their original order.
+    Texts of a single sentence are cut to length instead."""
+    def __init__(self, batch_size=256):
+        self.batch_size = batch_size
+        self.model = None
+
+    def summarize_all(self, texts, max_words=200):
+        summaries = [None] * len(texts)
+        ranked = []
+        for i, text in enumerate(texts):
+            sentences = split_sentences(text)
+            if len(sentences) < 2:
+                words = " ".join(sentences).split()
+                summaries[i] = " ".join(words[:extract_words(len(words), max_words)])
+            else:
+                ranked.append((i, sentences))
+        if not ranked:
+            return summaries
+
+        if self.model is None:
+            self.model = model_registry.sentence_model()
+        embeddings = self.model.encode([s for _, sentences in ranked for s in sentences],
+                                       batch_size=self.batch_size, normalize_embeddings=True)
+        start = 0
+        for i, sentences in ranked:
+            scores = textrank(embeddings[start:start + len(sentences)])
+            start += len(sentences)
+            limit = extract_words(sum(len(s.split()) for s in sentences), max_words)
+            chosen, words = [], 0
+            for j in np.argsort(-scores, kind="stable"):
+                length = len(sentences[j].split())
+                if chosen and words + length > limit:
+                    continue
+                chosen.append(j)
+                words += length
+            summaries[i] = " ".join(" ".join(sentences[j] for j in sorted(chosen)).split()[:limit])
+        return summaries
+
+
+class CostRouter:
+    """Splits each batch between the extractive engine and the expensive summarizer.
+
+    summary_words is the summary length asked of the model; route_words defaults to
+    default_route_words(summary_words). estimate_tokens(text), when given (OpenAI), prices the
+    requests the extractive rows did not need."""
+    def __init__(self, summary_words=200, route_words=None,
+                 max_sentence_words=DEFAULT_SENTENCE_WORDS, estimate_tokens=None):
+        if route_words is None:
+            route_words = default_route_words(summary_words)
+        if route_words <= summary_words:
+            raise ValueError(f"Extractive routing needs a word limit above the summary length "
+                             f"({route_words} <= {summary_words} words)")
+        self.summary_words = summary_words
+        self.route_words = route_words
+        self.max_sentence_words = max_sentence_words
+        self.estimate_tokens = estimate_tokens
+        self.extractive = ExtractiveSummarizer()
+        self.extractive_rows = 0
+        self.model_rows = 0
+        self.extractive_seconds = 0.0
+        self.model_seconds = 0.0
+        self.tokens_saved = 0
+
+    def is_easy(self, text):
+        words = len(str(text).split())
+        if words > self.route_words:
+            return False
+        sentences = split_sentences(text)
+        return len(sentences) >= 2 and words / len(sentences) <= self.max_sentence_words
+
+    def key_for(self, key_for):
+        """Wrap a key function so extractive rows get the extractive engine's cache key"""
+        def routed_key(text):
+            key = key_for(text)
+            if key is None or not self.is_easy(text):
+                return key
+            return cache_key(text, "extractive", model_registry.SENTENCE_MODEL, max_words=self.summary_words,
+                             max_output_ratio=MAX_OUTPUT_RATIO)
+        return routed_key
+
+    def summarize(self, summarize_all):
+        """Wrap summarize_all(texts) so easy texts never reach it"""
+        def routed_summarize(texts):
+            routes = [self.is_easy(text) for text in texts]
+            easy = [i for i, is_easy in enumerate(routes) if is_easy]
+            hard = [i for i, is_easy in enumerate(routes) if not is_easy]
+            summaries = [None] * len(texts)
+            if easy:
+                start = time.perf_counter()
+                results = self.extractive.summarize_all([texts[i] for i in easy], max_words=self.summary_words)
+                self.extractive_seconds += time.perf_counter() - start
+                self.extractive_rows += len(easy)
+                if self.estimate_tokens is not None:
+                    self.tokens_saved += sum(self.estimate_tokens(texts[i]) for i in easy)
+                for i, summary in zip(easy, results):
+                    summaries[i] = summary
+            if hard:
+                start = time.perf_counter()
+                results = summarize_all([texts[i] for i in hard])
+                self.model_seconds += time.perf_counter() - start
+                self.model_rows += len(hard)
+                for i, summary in zip(hard, results):
+                    summaries[i] = summary
+            return summaries
+        return routed_summarize
+
+    def seconds_saved(self):
+        """Model time the extractive rows would have taken at this run's model speed, minus
+        the time they took; None until the model has summarized something"""
+        if not self.model_rows:
+            return None
+        return self.extractive_rows * self.model_seconds / self.model_rows - self.extractive_seconds
+
+    def stats(self):
+        total = self.extractive_rows + self.model_rows
+        line = (f"Routing: {self.extractive_rows} extractive, {self.model_rows} model "
+                f"({100 * self.extractive_rows / total if total else 0:.0f}% extractive)")
+        saved = self.seconds_saved()
+        if saved is not None:
+            line += f", about {max(saved, 0):.0f}s saved"
+        if self.estimate_tokens is not None:
+            line += f", about {self.tokens_saved} tokens saved"
+        return line
@@ -0,0 +1,81 @@
+"""Tk dialog for picking several sheets and columns to summarize in one run"""
+import tkinter as tk
+from tkinter import messagebox
+
+
+def describe(selection):
+    """Short summary of a selection for the main window"""
+    columns = {column for columns in selection.values() for column in columns}
+    total = sum(len(columns) for columns in selection.values())
+    return f"{len(selection)} sheet(s), {len(columns)} column(s): {total} summary column(s)"
+
+
+class SelectionDialog(tk.Toplevel):
+    """Modal picker with sheets on the left and the columns of the selected sheets on the right.
+
+    Each chosen sheet gets the chosen columns it has. Once the window is closed, `selection`
+    is {sheet: [columns]}, or None if the dialog was cancelled."""
+    def __init__(self, parent, sheets_columns, selection=None):
+        super().__init__(parent)
+        self.title("Sheets and columns")
+        self.transient(parent)
+        self.sheets_columns = sheets_columns
+        self.names = list(sheets_columns)
+        self.selection = None
+
+        lists = tk.Frame(self)
+        lists.pack(padx=10, pady=10)
+        tk.Label(lists, text="Sheets").grid(row=0, column=0)
+        tk.Label(lists, text="Columns").grid(row=0, column=1)
+        self.sheet_list = tk.Listbox(lists, selectmode=tk.MULTIPLE, exportselection=False, height=12, width=25)
+        self.sheet_list.grid(row=1, column=0, padx=5)
+        self.column_list = tk.Listbox(lists, selectmode=tk.MULTIPLE, exportselection=False, height=12, width=30)
+        self.column_list.grid(row=1, column=1, padx=5)
+        for name in self.names:
+            self.sheet_list.insert(tk.END, name if name is not None else "(whole file)")
+        self.sheet_list.bind("<<ListboxSelect>>", lambda event: self.show_columns(self.chosen_columns()))
+
+        buttons = tk.Frame(self)
+        buttons.pack(pady=(0, 10))
+        tk.Button(buttons, text="OK", width=8, command=self.accept).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Cancel", width=8, command=self.destroy).pack(side=tk.LEFT, padx=5)
+
+        # Start from the current selection, or the first sheet
+        selection = selection or {self.names[0]: []}
+        for i, name in enumerate(self.names):
+            if name in selection:
+                self.sheet_list.selection_set(i)
+        self.show_columns({column for columns in selection.values() for column in columns})
+
+        self.grab_set()
+        self.wait_window()
+
+    def chosen_sheets(self):
+        return [self.names[i] for i in self.sheet_list.curselection()]
+
+    def chosen_columns(self):
+        return {self.column_list.get(i) for i in self.column_list.curselection()}
+
+    def show_columns(self, keep):
+        """List the columns of every chosen sheet, in sheet order, keeping `keep` selected"""
+        columns = []
+        for sheet in self.chosen_sheets():
+            columns.extend(column for column in self.sheets_columns[sheet] if column not in columns)
+        self.column_list.delete(0, tk.END)
+        for i, column in enumerate(columns):
+            self.column_list.insert(tk.END, column)
+            if column in keep:
+                self.column_list.selection_set(i)
+
+    def accept(self):
+        columns = self.chosen_columns()
+        selection = {}
+        for sheet in self.chosen_sheets():
+            chosen = [column for column in self.sheets_columns[sheet] if column in columns]
+            if chosen:
+                selection[sheet] = chosen
+        if not selection:
+            messagebox.showerror("Error", "Please select at least one sheet and one of its columns!", parent=self)
+            return
+        self.selection = selection
+        self.destroy()
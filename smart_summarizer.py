@@ -0,0 +1,338 @@
+"""Smart summarization engine (KeyBERT + sentence relevance + BART) used by app_BART.py and the command line"""
+import os
+import sys
+import time
+import multiprocessing
+import model_registry
+from decoding import DEFAULT_PROFILE, generation_params, length_limits, tokens_per_word
+from instrumentation import Stats
+from summary_cache import needs_summary
+
+class SmartSummarizer:
+    MODEL_NAME = model_registry.BART_MODEL
+    # SENTENCES / PHRASES PER ENCODER CALL IN THE BATCHED EMBEDDING STAGE
+    ENCODE_BATCH_SIZE = 256
+    # BART INPUT LIMIT; LONGER CONTENT IS TRUNCATED (COUNTED AS rows_truncated)
+    MAX_INPUT_TOKENS = 1024
+
+    @classmethod
+    def cache_params(cls, max_length=200, min_length=100, runtime="torch", profile=DEFAULT_PROFILE):
+        """Settings that change the output, used in the summary cache key"""
+        return dict(max_words=max_length, min_words=min_length, **generation_params(profile),
+                    **model_registry.runtime_tag(runtime))
+
+    def __init__(self, runtime="torch", profile=DEFAULT_PROFILE, stats=None):
+        # MODELS COME FROM THE PROCESS-WIDE REGISTRY: LOADED ON FIRST USE, SHARED AFTERWARDS
+        self.runtime = runtime
+        # DECODING PROFILE (fast / balanced / quality), SETTABLE BETWEEN RUNS
+        self.profile = profile
+        # PER-STAGE TIMERS AND COUNTERS
+        self.stats = stats if stats is not None else Stats()
+        self.sentence_model = model_registry.sentence_model()
+        self.keyword_model = model_registry.keyword_model()
+        self.tokenizer = model_registry.bart_tokenizer(self.MODEL_NAME)
+        self.model = model_registry.bart_model(self.MODEL_NAME, runtime)
+
+    def extract_key_concepts(self, text):
+        #IDENTIFY CORE CONCEPTS USING KEYBERT
+        with self.stats.time("keywords"):
+            return [kw[0] for kw in 
+                    self.keyword_model.extract_keywords(
+                        text,
+                        keyphrase_ngram_range=(1, 2),
+                        stop_words='english',
+                        top_n=5
+                    )]
+
+    @staticmethod
+    def split_sentences(text):
+        return [s.strip() for s in text.split('. ') if len(s) > 10]
+
+    def select_relevant_sentences(self, text, concepts):
+        """Semantic filtering of important sentences"""
+        import numpy as np
+        from sklearn.metrics.pairwise import cosine_similarity
+        
+        sentences = self.split_sentences(text)
+        if len(sentences) < 3:
+            return text
+            
+        with self.stats.time("sentence_selection"):
+            # ENCODE AND COMPARE
+            sentence_embeddings = self.sentence_model.encode(sentences)
+            concept_embeddings = self.sentence_model.encode(concepts)
+            similarity_scores = cosine_similarity(sentence_embeddings, concept_embeddings)
+            
+            # SELECT TOP 3 MOST RELEVANT SENTENCES
+            top_indices = np.argsort(np.max(similarity_scores, axis=1))[-3:][::-1]
+            return '. '.join([sentences[i] for i in top_indices if similarity_scores[i].max() > 0.3])
+
+    def extract_key_concepts_batch(self, texts):
+        """KeyBERT over a block of rows, with every document and candidate phrase encoded in one pass.
+        Returns (concepts, concept_embeddings) per row so the relevance scorer can reuse them."""
+        import numpy as np
+        from sklearn.feature_extraction.text import CountVectorizer
+        
+        vectorizer = CountVectorizer(ngram_range=(1, 2), stop_words='english')
+        try:
+            vectorizer.fit(texts)
+        except ValueError:
+            # NO CANDIDATE PHRASES AT ALL (E.G. ONLY STOP WORDS)
+            return [([], np.zeros((0, 1))) for _ in texts]
+        words = vectorizer.get_feature_names_out()
+        
+        doc_embeddings = self.sentence_model.encode(texts, batch_size=self.ENCODE_BATCH_SIZE)
+        word_embeddings = self.sentence_model.encode(list(words), batch_size=self.ENCODE_BATCH_SIZE)
+        keywords = self.keyword_model.extract_keywords(
+            texts,
+            vectorizer=vectorizer,
+            doc_embeddings=doc_embeddings,
+            word_embeddings=word_embeddings,
+            top_n=5
+        )
+        if len(texts) == 1:
+            keywords = [keywords]
+        
+        vocabulary = vectorizer.vocabulary_
+        results = []
+        for row_keywords in keywords:
+            concepts = [kw[0] for kw in row_keywords]
+            results.append((concepts, word_embeddings[[vocabulary[c] for c in concepts]]))
+        return results
+
+    def select_relevant_batch(self, texts, block_size=64):
+        """select_relevant_sentences for a block of rows: all sentences are encoded in large batches
+        and the similarity / top-3 selection is one padded matrix operation per block"""
+        results = list(texts)
+        with self.stats.time("keywords"):
+            concepts = self.extract_key_concepts_batch(texts)
+        with self.stats.time("sentence_selection"):
+            return self.select_sentences_batch(texts, concepts, results, block_size)
+
+    def select_sentences_batch(self, texts, concepts, results, block_size):
+        import numpy as np
+        
+        sentence_lists = [self.split_sentences(text) for text in texts]
+        rows = [i for i, sentences in enumerate(sentence_lists)
+                if len(sentences) >= 3 and len(concepts[i][0]) > 0]
+        if not rows:
+            return results
+        
+        flat = [s for i in rows for s in sentence_lists[i]]
+        embeddings = self.sentence_model.encode(flat, batch_size=self.ENCODE_BATCH_SIZE)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        offsets = np.cumsum([0] + [len(sentence_lists[i]) for i in rows])
+        
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            max_sentences = max(len(sentence_lists[i]) for i in block)
+            max_concepts = max(len(concepts[i][0]) for i in block)
+            dim = embeddings.shape[1]
+            
+            # PAD TO [ROWS, SENTENCES, DIM] AND [ROWS, CONCEPTS, DIM]
+            S = np.zeros((len(block), max_sentences, dim), dtype=np.float32)
+            C = np.zeros((len(block), max_concepts, dim), dtype=np.float32)
+            sentence_mask = np.zeros((len(block), max_sentences), dtype=bool)
+            concept_mask = np.zeros((len(block), max_concepts), dtype=bool)
+            for b, i in enumerate(block):
+                k = start + b
+                n = offsets[k + 1] - offsets[k]
+                S[b, :n] = embeddings[offsets[k]:offsets[k + 1]]
+                sentence_mask[b, :n] = True
+                vectors = concepts[i][1]
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                C[b, :len(vectors)] = vectors
+                concept_mask[b, :len(vectors)] = True
+            
+            # COSINE SIMILARITY OF EVERY SENTENCE TO ITS ROW'S CONCEPTS, BEST CONCEPT PER SENTENCE
+            similarity = np.einsum('bsd,bkd->bsk', S, C)
+            similarity[~np.broadcast_to(concept_mask[:, None, :], similarity.shape)] = -np.inf
+            scores = similarity.max(axis=2)
+            scores[~sentence_mask] = -np.inf
+            
+            # SELECT TOP 3 MOST RELEVANT SENTENCES PER ROW
+            top = np.argsort(-scores, axis=1, kind='stable')[:, :3]
+            for b, i in enumerate(block):
+                results[i] = '. '.join(sentence_lists[i][j] for j in top[b] if scores[b, j] > 0.3)
+        return results
+
+    def summarize_content(self, important_content, max_length=200, min_length=100):
+        """Abstractive BART step on the selected content; lengths are in words"""
+        stats = self.stats
+        try:
+            # GENERATE SUMMARY WITH PROPER PARAMETERES
+            with stats.time("tokenize"):
+                inputs = self.tokenizer(
+                    important_content,
+                    max_length=self.MAX_INPUT_TOKENS,
+                    truncation=True,
+                    return_tensors="pt"
+                ).to(self.model.device)
+            
+            # CONVERT WORDS TO TOKENS FOR THIS TEXT, CAPPED BY WHAT BART ACTUALLY READS
+            input_tokens = inputs['input_ids'].shape[1]
+            # THE RATIO NEEDS THE WHOLE TEXT'S TOKENS, NOT THE 1024 LEFT AFTER TRUNCATION
+            text_tokens = input_tokens
+            if input_tokens >= self.MAX_INPUT_TOKENS:
+                text_tokens = len(self.tokenizer(important_content, verbose=False)['input_ids'])
+            min_tokens, max_tokens = length_limits(min_length, max_length, input_tokens,
+                                                   tokens_per_word([important_content], [text_tokens]))
+            start = time.perf_counter()
+            with stats.trace():
+                summary_ids = self.model.generate(
+                    inputs['input_ids'],
+                    max_length=max_tokens,
+                    min_length=min_tokens,
+                    **generation_params(self.profile)
+                )
+            generate_seconds = time.perf_counter() - start
+            stats.add_time("generate", generate_seconds)
+            
+            with stats.time("decode"):
+                summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+            
+            output_tokens = summary_ids.shape[1]
+            truncated = input_tokens >= self.MAX_INPUT_TOKENS
+            stats.count("rows_summarized")
+            stats.count("tokens_in", input_tokens)
+            stats.count("tokens_out", output_tokens)
+            if truncated:
+                stats.count("rows_truncated")
+            if stats.logging:
+                stats.event("row", tokens_in=input_tokens, tokens_out=output_tokens, truncated=truncated,
+                            generate_seconds=round(generate_seconds, 4), profile=self.profile)
+            return summary
+            
+        except Exception as e:
+            print(f"⚠️ Error processing one entry: {str(e)[:100]}...")
+            stats.error("generate", e)
+            stats.count("rows_failed")
+            return "[SUMMARY FAILED]"
+
+    def generate_summary(self, text, max_length=200, min_length=100):
+        """End-to-end smart summarization"""
+        try:
+            # SAME RULE AS THE CACHE KEYS, SO A SKIPPED ROW IS NEVER SENT TO THE ENGINE AGAIN
+            if not needs_summary(text):
+                return ""
+                
+            text = str(text)
+            concepts = self.extract_key_concepts(text)
+            important_content = self.select_relevant_sentences(text, concepts) or text
+        except Exception as e:
+            print(f"⚠️ Error processing one entry: {str(e)[:100]}...")
+            self.stats.error("extraction", e)
+            self.stats.count("rows_failed")
+            return "[SUMMARY FAILED]"
+        
+        return self.summarize_content(important_content, max_length=max_length, min_length=min_length)
+
+    def generate_summaries(self, texts, max_length=200, min_length=100):
+        """Smart summarization of a block of rows sharing one batched embedding stage"""
+        summaries = [""] * len(texts)
+        todo = [i for i, text in enumerate(texts) if needs_summary(text)]
+        self.stats.count("rows_skipped", len(texts) - len(todo))
+        if not todo:
+            return summaries
+        
+        try:
+            selected = self.select_relevant_batch([str(texts[i]) for i in todo])
+        except Exception as e:
+            # FALL BACK TO ONE ROW AT A TIME SO A SINGLE BAD ROW DOESN'T FAIL THE BLOCK
+            print(f"⚠️ Batched extraction failed, retrying row by row: {str(e)[:100]}...")
+            self.stats.error("batch_extraction", e)
+            for i in todo:
+                summaries[i] = self.generate_summary(texts[i], max_length=max_length, min_length=min_length)
+            return summaries
+        
+        for i, important_content in zip(todo, selected):
+            summaries[i] = self.summarize_content(important_content or str(texts[i]),
+                                                  max_length=max_length, min_length=min_length)
+        return summaries
+
+# ONE SUMMARIZER PER WORKER PROCESS, LOADED ONCE BY THE POOL INITIALIZER
+_worker_summarizer = None
+
+def _init_worker(num_threads, runtime, stats_config):
+    global _worker_summarizer
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_summarizer = SmartSummarizer(runtime, stats=Stats(**stats_config))
+
+def _summarize_chunk(task):
+    chunk, max_length, min_length, profile, logging = task
+    _worker_summarizer.profile = profile
+    # FOLLOW THE PARENT'S LOG: NO PER-ROW EVENTS ARE BUILT OR SENT BACK WHILE NOTHING IS LOGGED
+    _worker_summarizer.stats.buffer_events = logging
+    summaries = _worker_summarizer.generate_summaries([text for _, text in chunk],
+                                                      max_length=max_length, min_length=min_length)
+    # TIMINGS AND EVENTS TRAVEL BACK WITH THE RESULTS AND ARE MERGED INTO THE PARENT'S STATS
+    return [(index, summary) for (index, _), summary in zip(chunk, summaries)], _worker_summarizer.stats.drain()
+
+class ParallelSmartSummarizer:
+    """Runs SmartSummarizer across a pool of worker processes"""
+    def __init__(self, workers=1, chunk_size=16, runtime="torch", profile=DEFAULT_PROFILE, stats=None):
+        self.workers = max(1, int(workers))
+        self.chunk_size = max(1, int(chunk_size))
+        self.runtime = runtime
+        self.profile = profile
+        self.stats = stats if stats is not None else Stats()
+        self.pool = None
+        self.summarizer = None
+        
+        if self.workers == 1:
+            self.summarizer = SmartSummarizer(runtime, profile, stats=self.stats)
+        else:
+            # SPLIT CPU THREADS EVENLY SO WORKERS DON'T OVERSUBSCRIBE THE CORES
+            num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            context = multiprocessing.get_context("spawn")
+            self.pool = context.Pool(self.workers, initializer=_init_worker,
+                                     initargs=(num_threads, runtime, self.stats.worker_config()))
+
+    @property
+    def tokenizer(self):
+        # THE POOL'S MODELS LIVE IN THE WORKERS; THE PARENT ONLY NEEDS A TOKENIZER TO SPLIT LONG TEXTS
+        if self.summarizer is not None:
+            return self.summarizer.tokenizer
+        return model_registry.bart_tokenizer(SmartSummarizer.MODEL_NAME)
+
+    def summarize_all(self, texts, max_length=200, min_length=100):
+        """Summarize every text, returning results in the original row order"""
+        from tqdm import tqdm
+        
+        summaries = [""] * len(texts)
+        todo = [(i, str(text)) for i, text in enumerate(texts) if needs_summary(text)]
+        self.stats.count("rows_skipped", len(texts) - len(todo))
+        
+        if self.pool is None:
+            # BLOCKS OF ROWS SHARE ONE BATCHED EMBEDDING STAGE
+            block_size = self.chunk_size * 4
+            self.summarizer.profile = self.profile
+            with tqdm(total=len(todo), desc="Generating smart summaries", disable=sys.stderr is None) as progress:
+                for start in range(0, len(todo), block_size):
+                    block = todo[start:start + block_size]
+                    results = self.summarizer.generate_summaries([text for _, text in block],
+                                                                 max_length=max_length, min_length=min_length)
+                    for (i, _), summary in zip(block, results):
+                        summaries[i] = summary
+                    progress.update(len(block))
+            return summaries
+        
+        # LONGEST TEXTS GO OUT FIRST SO NO WORKER IS LEFT RUNNING ALONE AT THE END
+        todo.sort(key=lambda item: len(item[1]), reverse=True)
+        tasks = [(todo[start:start + self.chunk_size], max_length, min_length, self.profile, self.stats.logging)
+                 for start in range(0, len(todo), self.chunk_size)]
+        
+        with tqdm(total=len(todo), desc="Generating smart summaries", disable=sys.stderr is None) as progress:
+            for results, worker_stats in self.pool.imap_unordered(_summarize_chunk, tasks):
+                for index, summary in results:
+                    summaries[index] = summary
+                self.stats.merge(worker_stats)
+                progress.update(len(results))
+        return summaries
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -0,0 +1,283 @@
+"""Headless command-line entry point for all three summarizers (no Tk required).
+
+    python summarize.py --backend bart --input books.xlsx --column Preface
+    python summarize.py --backend openai --input books.csv --column Preface --output out.csv
+    python summarize.py --backend bart --input catalogue.xlsx --all-sheets --column Preface Foreword
+    python summarize.py --backend bart --input catalogue.xlsx --job job.json
+
+A job file maps sheet names to the columns to summarize, e.g. {"2023": ["Preface", "Foreword"],
+"2024": ["Preface"]}. All selected texts share one work queue and one model instance.
+
+Heavy libraries (torch, transformers, openai...) are imported only for the chosen backend."""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKENDS = ("bart", "smart", "openai")
+
+# Per-backend defaults, matching the desktop apps
+DEFAULTS = {
+    "bart": dict(min_words=100, max_words=200, summary_column="Summary"),
+    "smart": dict(min_words=100, max_words=200, summary_column="Summary"),
+    "openai": dict(min_words=40, max_words=50, summary_column="Catalogue Summary"),
+}
+
+
+def add_engine_arguments(parser):
+    """Backend options shared with summary_service.py"""
+    engine = parser.add_argument_group("engine options")
+    engine.add_argument("--batch-size", type=int, default=8, help="bart: rows per forward pass")
+    engine.add_argument("--workers", type=int, default=1, help="smart: worker processes")
+    engine.add_argument("--concurrency", type=int, default=8, help="openai: parallel requests")
+    engine.add_argument("--model", default="gpt-3.5-turbo", help="openai: chat model")
+    engine.add_argument("--pack-tokens", type=int, default=0,
+                        help="openai: send several short texts per request, up to this many prompt tokens (0 = off)")
+    engine.add_argument("--runtime", choices=("torch", "int8", "onnx"), default="torch",
+                        help="bart/smart: torch (fp32), int8 (quantized, CPU) or onnx (ONNX Runtime, CPU)")
+    engine.add_argument("--profile", choices=("fast", "balanced", "quality"), default="balanced",
+                        help="bart/smart: decoding profile (greedy, 2-beam or 4-beam search)")
+    engine.add_argument("--long-documents", action="store_true",
+                        help="bart/smart: summarize texts over 1024 tokens in full (map-reduce) instead of truncating")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a text column of an Excel, CSV or Parquet file.")
+    parser.add_argument("--backend", choices=BACKENDS, required=True,
+                        help="bart (app.py), smart (app_BART.py) or openai (app_OPENAI.py)")
+    parser.add_argument("--input", required=True, help="Input .xlsx, .xls, .csv or .parquet file")
+    parser.add_argument("--column", nargs="+", help="Column(s) containing the texts to summarize")
+    parser.add_argument("--sheet", nargs="+", help="Excel sheet(s) to read (default: the first sheet)")
+    parser.add_argument("--all-sheets", action="store_true", help="Read every sheet that has the --column(s)")
+    parser.add_argument("--job", help="JSON file mapping sheet names to lists of columns, instead of --sheet/--column")
+    parser.add_argument("--output", help="Output .xlsx, .csv or .parquet file (default: <input>_summarized.xlsx)")
+    parser.add_argument("--summary-column", help="Name of the added column")
+    parser.add_argument("--min-words", type=int, help="Minimum summary length")
+    parser.add_argument("--max-words", type=int, help="Maximum summary length")
+    parser.add_argument("--chunksize", type=int, default=1000, help="Rows read and written per chunk")
+
+    add_engine_arguments(parser)
+
+    cache = parser.add_argument_group("cache and checkpoints")
+    cache.add_argument("--no-cache", action="store_true", help="Do not read or write the summary cache")
+    cache.add_argument("--force-refresh", action="store_true", help="Regenerate every row, then update the cache")
+    cache.add_argument("--cache-path", help="Cache database (default: ~/.cache/smart_summarizer/summaries.sqlite)")
+    cache.add_argument("--restart", action="store_true",
+                       help="Ignore the checkpoint of an interrupted run instead of resuming it")
+
+    duplicates = parser.add_argument_group("duplicates")
+    duplicates.add_argument("--dedup", choices=("off", "exact", "minhash", "embedding"), default="exact",
+                            help="Summarize repeated texts once: exact (same text after whitespace cleanup), "
+                                 "minhash (also near duplicates by shared word sequences) or "
+                                 "embedding (also near duplicates by MiniLM similarity)")
+    duplicates.add_argument("--similarity", type=float, default=0.9,
+                            help="minhash/embedding: Jaccard or cosine similarity needed to reuse a summary")
+    duplicates.add_argument("--dedup-report", help="Write a CSV of every row that reused another row's summary")
+
+    routing = parser.add_argument_group("routing")
+    routing.add_argument("--route-words", type=int, default=0,
+                         help="Give texts up to this many words an extractive (TextRank) summary instead "
+                              "of a model call; must exceed --max-words (0 = off, e.g. 300 for BART, 150 for OpenAI)")
+    routing.add_argument("--route-sentence-words", type=int, default=25,
+                         help="Texts longer than the summary only go extractive if their sentences "
+                              "average at most this many words")
+
+    profiling = parser.add_argument_group("profiling")
+    profiling.add_argument("--stats", action="store_true",
+                           help="Print time per stage (smart) and row/cache counters at the end")
+    profiling.add_argument("--log-jsonl", help="Append structured per-row and per-run events to this file")
+    profiling.add_argument("--trace-rows", type=int, default=0,
+                           help="smart: write torch profiler traces for this many generate calls per process")
+    profiling.add_argument("--trace-every", type=int, default=10, help="smart: trace every Nth generate call")
+    profiling.add_argument("--trace-dir", default="traces", help="smart: directory for profiler traces")
+
+    args = parser.parse_args(argv)
+    if not args.column and not args.job:
+        parser.error("--column or --job is required")
+    for name, value in DEFAULTS[args.backend].items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    if args.route_words and args.route_words <= args.max_words:
+        parser.error(f"--route-words must exceed the summary length (--max-words {args.max_words})")
+    if not args.output:
+        args.output = os.path.splitext(args.input)[0] + "_summarized.xlsx"
+    return args
+
+
+def selection_for(args):
+    """{sheet: [columns]} from --job, else from --sheet/--all-sheets and --column"""
+    if args.job:
+        with open(args.job, encoding="utf-8") as f:
+            spec = json.load(f)
+        return {sheet: [columns] if isinstance(columns, str) else list(columns) for sheet, columns in spec.items()}
+    if args.all_sheets:
+        from excel_io import workbook_columns
+        sheets = [sheet for sheet, columns in workbook_columns(args.input).items()
+                  if all(column in columns for column in args.column)]
+        if not sheets:
+            raise KeyError(f"No sheet of {args.input} has the column(s) {', '.join(args.column)}")
+    else:
+        sheets = args.sheet or [None]
+    return {sheet: list(args.column) for sheet in sheets}
+
+
+def long_document_wrapper(args, engine, cache, cache_tag):
+    """Run engine.summarize_all directly, or through map-reduce when --long-documents is set"""
+    def summarize_all(texts):
+        if args.long_documents:
+            from long_text import MapReduceSummarizer
+            long_summarizer = MapReduceSummarizer(engine.tokenizer, engine.summarize_all,
+                                                  cache=cache, cache_tag=cache_tag)
+            return long_summarizer.summarize_all(texts, max_length=args.max_words, min_length=args.min_words)
+        return engine.summarize_all(texts, max_length=args.max_words, min_length=args.min_words)
+    return summarize_all
+
+
+def build_backend(args, cache, stats=None):
+    """Returns (model_name, cache_params, summarize_all, close) for the chosen backend"""
+    from decoding import generation_params
+    from model_registry import runtime_tag
+    if args.backend == "bart":
+        from bart_summarizer import MODEL_NAME, BatchSummarizer, load_pipeline
+        params = BatchSummarizer.cache_params(max_length=args.max_words, min_length=args.min_words,
+                                              runtime=args.runtime, profile=args.profile)
+        if args.long_documents:
+            params["long_documents"] = True
+        engine = []
+
+        def summarize_all(texts):
+            # Load the model only once some rows are not cached
+            if not engine:
+                engine.append(BatchSummarizer(load_pipeline(runtime=args.runtime), batch_size=args.batch_size,
+                                              profile=args.profile))
+            run = long_document_wrapper(args, engine[0], cache, dict(backend="bart", model=MODEL_NAME,
+                                                                     **generation_params(args.profile),
+                                                                     **runtime_tag(args.runtime)))
+            return run(texts)
+
+        return MODEL_NAME, params, summarize_all, lambda: None
+
+    if args.backend == "smart":
+        from smart_summarizer import SmartSummarizer, ParallelSmartSummarizer
+        params = SmartSummarizer.cache_params(max_length=args.max_words, min_length=args.min_words,
+                                              runtime=args.runtime, profile=args.profile)
+        if args.long_documents:
+            params["long_documents"] = True
+        engine = []
+
+        def summarize_all(texts):
+            if not engine:
+                engine.append(ParallelSmartSummarizer(workers=args.workers, runtime=args.runtime,
+                                                      profile=args.profile, stats=stats))
+            run = long_document_wrapper(args, engine[0], cache, dict(backend="smart", model=SmartSummarizer.MODEL_NAME,
+                                                                     **generation_params(args.profile),
+                                                                     **runtime_tag(args.runtime)))
+            return run(texts)
+
+        def close():
+            if engine:
+                engine[0].close()
+
+        return SmartSummarizer.MODEL_NAME, params, summarize_all, close
+
+    import dotenv
+    from gpt_summarizer import AsyncChatGPTSummarizer
+    dotenv.load_dotenv()
+    summarizer = AsyncChatGPTSummarizer(concurrency=args.concurrency, model=args.model, pack_tokens=args.pack_tokens)
+    params = summarizer.cache_params(args.min_words, args.max_words)
+
+    def summarize_all(texts):
+        return summarizer.summarize_all(texts, min_words=args.min_words, max_words=args.max_words)
+
+    def close():
+        summarizer.close()
+        if summarizer.usage["texts"]:
+            print(summarizer.usage_stats(), file=sys.stderr)
+
+    return summarizer.model, params, summarize_all, close
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selection = selection_for(args)
+
+    import warnings
+    from checkpoint import JobCheckpoint
+    from dedup import Deduplicator
+    from instrumentation import Stats
+    from router import CostRouter
+    from summary_cache import SummaryCache, cache_key, needs_summary
+    from summary_job import SummaryJob
+    warnings.filterwarnings("ignore")
+
+    cache = None if args.no_cache else SummaryCache(path=args.cache_path, force_refresh=args.force_refresh)
+    stats = Stats(log_path=args.log_jsonl, trace_rows=args.trace_rows, trace_every=args.trace_every,
+                  trace_dir=args.trace_dir)
+    model_name, params, summarize_all, close = build_backend(args, cache, stats)
+
+    def key_for(text):
+        return cache_key(text, args.backend, model_name, **params) if needs_summary(text) else None
+
+    router = None
+    if args.route_words:
+        estimate_tokens = None
+        if args.backend == "openai":
+            from gpt_summarizer import AsyncChatGPTSummarizer
+            template = AsyncChatGPTSummarizer(model=args.model)
+            estimate_tokens = lambda text: template.estimate_tokens(
+                template.build_messages(str(text), args.min_words, args.max_words))
+        router = CostRouter(summary_words=args.max_words, route_words=args.route_words,
+                            max_sentence_words=args.route_sentence_words, estimate_tokens=estimate_tokens)
+        key_for = router.key_for(key_for)
+        summarize_all = router.summarize(summarize_all)
+
+    dedup = None if args.dedup == "off" else Deduplicator(args.dedup, threshold=args.similarity,
+                                                          report=bool(args.dedup_report))
+    checkpoint = JobCheckpoint(args.output)
+    if checkpoint.exists():
+        if args.restart:
+            checkpoint.discard()
+        else:
+            print(f"Resuming from {checkpoint.path}", file=sys.stderr)
+
+    def progress(snapshot):
+        total = snapshot["total_rows"]
+        print(f"Processed {snapshot['rows_done']}" + (f"/{total}" if total else "") + " rows", file=sys.stderr)
+
+    job = SummaryJob(args.input, None, args.output, summarize_all, key_for,
+                     cache=cache, checkpoint=checkpoint, summary_column=args.summary_column,
+                     chunksize=args.chunksize, dedup=dedup, selection=selection)
+    start = time.perf_counter()
+    try:
+        rows = job.run(progress=progress)
+        # Before add_job, which logs the counters with the run summary
+        if router is not None:
+            stats.set_counters(routed_extractive=router.extractive_rows, routed_model=router.model_rows)
+        stats.add_job(job, cache)
+    finally:
+        close()
+        stats.close()
+        if cache is not None:
+            cache.close()
+
+    elapsed = time.perf_counter() - start
+    unit = "rows" if all(len(columns) == 1 for columns in selection.values()) else "texts"
+    print(f"Wrote {rows} {unit} to {args.output} in {elapsed:.1f}s", file=sys.stderr)
+    if job.rows_resumed:
+        print(f"Resumed {job.rows_resumed} rows from checkpoint", file=sys.stderr)
+    if cache is not None:
+        print(cache.stats(), file=sys.stderr)
+    if router is not None:
+        print(router.stats(), file=sys.stderr)
+    if dedup is not None:
+        print(dedup.stats(), file=sys.stderr)
+        if args.dedup_report:
+            dedup.write_report(args.dedup_report)
+    if args.stats:
+        print(stats.table(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
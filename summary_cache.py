@@ -0,0 +1,141 @@
+"""Persistent, content-addressed cache of generated summaries, shared by all three apps"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import pandas as pd
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smart_summarizer", "summaries.sqlite")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Results that must never be served from the cache
+UNCACHEABLE = {"", "[SUMMARY FAILED]"}
+# Rows with fewer words are left blank by every backend and get no cache key
+MIN_SUMMARY_WORDS = 10
+
+
+def needs_summary(text):
+    """Rows that are empty or shorter than MIN_SUMMARY_WORDS words are left blank"""
+    return not (pd.isna(text) or len(str(text).split()) < MIN_SUMMARY_WORDS)
+
+
+def normalize_text(text):
+    """Collapse whitespace so re-saved or re-wrapped cells hash the same"""
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+def cache_key(text, backend, model, **params):
+    payload = json.dumps(
+        {"text": normalize_text(text), "backend": backend, "model": model, "params": params},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """SQLite store of summaries keyed by input hash and generation settings, evicted LRU by size"""
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, force_refresh=False):
+        self.path = path or os.getenv("SUMMARY_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        self.force_refresh = force_refresh
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS summaries_accessed ON summaries (accessed)")
+        self.conn.commit()
+
+    key = staticmethod(cache_key)
+
+    def get_many(self, keys):
+        """Return {key: summary} for the cached keys; None keys are ignored"""
+        keys = [k for k in keys if k is not None]
+        if self.force_refresh:
+            self.misses += len(keys)
+            return {}
+
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = list(set(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE summaries SET accessed = ? WHERE key = ?",
+                                      [(now, k) for k in found])
+                self.conn.commit()
+
+        hits = sum(1 for k in keys if k in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items):
+        """Store (key, summary) pairs, skipping empty and failed summaries"""
+        now = time.time()
+        rows = [(k, s, len(k) + len(s.encode("utf-8")), now)
+                for k, s in items if k is not None and s not in UNCACHEABLE]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM summaries ORDER BY accessed"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM summaries WHERE key = ?", stale)
+        self.conn.commit()
+
+    def summarize(self, texts, keys, summarize_all):
+        """Serve cached rows and run summarize_all only on the misses; results keep the input order.
+
+        keys[i] is None for rows that should not be summarized (empty/too short)."""
+        summaries = [""] * len(texts)
+        cached = self.get_many(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            if key is None:
+                continue
+            if key in cached:
+                summaries[i] = cached[key]
+            else:
+                missing.append(i)
+
+        if missing:
+            results = summarize_all([texts[i] for i in missing])
+            for i, summary in zip(missing, results):
+                summaries[i] = summary
+            self.put_many([(keys[i], summaries[i]) for i in missing])
+        return summaries
+
+    def stats(self):
+        return f"Cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
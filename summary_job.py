@@ -0,0 +1,252 @@
+"""Chunked summarization job shared by the three apps: read sheets, summarize columns, stream out the result"""
+import threading
+import time
+import pandas as pd
+from excel_io import ChunkWriter, count_rows, file_format, input_schema, iter_sheets, read_columns
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobControl:
+    """Thread-safe pause/cancel switches checked by a running job between batches"""
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def check(self):
+        """Block while paused; raise JobCancelled once cancelled"""
+        self.running.wait()
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+
+class SummaryJob:
+    """Streams `column` of `input_path` through a summarizer and appends the result to `output_path`.
+
+    selection ({sheet: [columns]}, None meaning the first sheet) summarizes several columns of
+    several sheets in one pass instead: their texts share one work queue, so batching, caching
+    and deduplication apply across all of them, and each sheet is written with a summary column
+    per selected column. Progress counts texts, i.e. rows times selected columns.
+
+    summarize_all(texts) -> summaries is only called with rows that need the model;
+    key_for(text) returns the cache key for a row, or None when the row should be left empty.
+    With a checkpoint, finished rows are journaled after every batch and reused when the job is
+    run again with the same settings (a crash loses at most the batch in flight).
+    With a dedup.Deduplicator, only one row per group of duplicates is sent to the model.
+    Rows are sent to the model `batch_rows` at a time, so progress and pause/cancel
+    are handled between batches rather than once per chunk."""
+    def __init__(self, input_path, column, output_path, summarize_all, key_for,
+                 cache=None, checkpoint=None, summary_column="Summary", chunksize=1000, batch_rows=256,
+                 dedup=None, selection=None):
+        self.input_path = input_path
+        self.column = column
+        self.selection = selection or {None: [column]}
+        self.output_path = output_path
+        self.summarize_all = summarize_all
+        self.key_for = key_for
+        self.cache = cache
+        self.checkpoint = checkpoint
+        self.dedup = dedup
+        self.summary_column = summary_column
+        self.chunksize = chunksize
+        self.batch_rows = max(1, batch_rows)
+        self.total_rows = None
+        self.rows_done = 0
+        self.rows_resumed = 0
+        self.rows_summarized = 0
+        self.rows_failed = 0
+        self.rows_skipped = 0
+        self.cancelled = False
+        self.started = None
+        self.progress = None
+        self.control = None
+
+    def snapshot(self):
+        """Counters for progress displays"""
+        return {
+            "rows_done": self.rows_done,
+            "total_rows": self.total_rows,
+            "summarized": self.rows_summarized,
+            "resumed": self.rows_resumed,
+            "failed": self.rows_failed,
+            "skipped": self.rows_skipped,
+            "cache_hits": self.cache.hits if self.cache is not None else 0,
+            "duplicates": self.dedup.saved if self.dedup is not None else 0,
+            "elapsed": time.perf_counter() - self.started if self.started else 0.0,
+        }
+
+    def report(self, rows_done):
+        self.rows_done = rows_done
+        if self.progress:
+            self.progress(self.snapshot())
+
+    def summarize_unique(self, texts, keys):
+        if self.cache is not None:
+            return self.cache.summarize(texts, keys, self.summarize_all)
+        return self.summarize_all(texts)
+
+    def summarize_chunk(self, texts, first_row=0):
+        """Summaries for one chunk. On cancel, JobCancelled carries how many leading rows are final."""
+        keys = [self.key_for(text) for text in texts]
+        summaries = [""] * len(texts)
+        todo = []
+        for i, key in enumerate(keys):
+            if key is None:
+                self.rows_skipped += 1
+                continue
+            saved = self.checkpoint.lookup(first_row + i, key) if self.checkpoint else None
+            if saved is not None:
+                summaries[i] = saved
+                self.rows_resumed += 1
+            else:
+                todo.append(i)
+
+        for start in range(0, len(todo), self.batch_rows):
+            if self.control:
+                try:
+                    self.control.check()
+                except JobCancelled as e:
+                    # Everything before the first unprocessed row is complete
+                    e.rows_final = todo[start]
+                    e.summaries = summaries
+                    raise
+
+            batch = todo[start:start + self.batch_rows]
+            batch_texts = [texts[i] for i in batch]
+            batch_keys = [keys[i] for i in batch]
+            if self.dedup is not None:
+                results = self.dedup.summarize(batch_texts, batch_keys, self.summarize_unique,
+                                               rows=[first_row + i for i in batch])
+            else:
+                results = self.summarize_unique(batch_texts, batch_keys)
+
+            for i, summary in zip(batch, results):
+                summaries[i] = summary
+                self.rows_summarized += 1
+                if summary == "[SUMMARY FAILED]":
+                    self.rows_failed += 1
+                if self.checkpoint:
+                    self.checkpoint.record(first_row + i, keys[i], summary)
+            if self.checkpoint:
+                self.checkpoint.flush()
+
+            next_row = todo[start + self.batch_rows] if start + self.batch_rows < len(todo) else len(texts)
+            self.report(first_row + next_row)
+        return summaries
+
+    def summary_name(self, sheet, column):
+        """The added column: `summary_column`, prefixed with the source column when a sheet has several"""
+        return self.summary_column if len(self.selection[sheet]) == 1 else f"{column} {self.summary_column}"
+
+    def count_texts(self):
+        total = 0
+        for sheet, columns in self.selection.items():
+            rows = count_rows(self.input_path, sheet)
+            if rows is None:
+                return None
+            total += rows * len(columns)
+        return total
+
+    def process(self, writer, pending):
+        """Summarize the queued (sheet, chunk) pairs as one list of texts, row by row with the
+        selected columns side by side, then write each chunk to its sheet"""
+        texts = []
+        for sheet, chunk in pending:
+            texts.extend(value for row in chunk[self.selection[sheet]].itertuples(index=False, name=None)
+                         for value in row)
+        first_row = self.rows_done
+        try:
+            if self.control:
+                self.control.check()
+            summaries = self.summarize_chunk(texts, first_row)
+            final = len(texts)
+        except JobCancelled as e:
+            # Keep the partial results: write the rows whose columns are all finished
+            summaries = getattr(e, "summaries", [])
+            final = getattr(e, "rows_final", 0)
+            self.cancelled = True
+
+        position, written = 0, 0
+        for sheet, chunk in pending:
+            width = len(self.selection[sheet])
+            size = len(chunk) * width
+            rows = min(len(chunk), max(0, final - position) // width)
+            if rows < len(chunk):
+                chunk = chunk.iloc[:rows].copy()
+            for offset, column in enumerate(self.selection[sheet]):
+                chunk[self.summary_name(sheet, column)] = summaries[position + offset:position + rows * width:width]
+            if rows or not self.cancelled:
+                writer.write(chunk, sheet)
+            position += size
+            written += rows * width
+
+        if self.cancelled:
+            self.rows_done = first_row + written
+            return
+        if self.checkpoint:
+            self.checkpoint.flush()
+        self.report(first_row + len(texts))
+
+    def run(self, progress=None, control=None):
+        """Process the whole file. progress(snapshot) is called after every batch; with a
+        JobControl the job can be paused or cancelled, keeping the rows finished so far."""
+        if len(self.selection) > 1 and file_format(self.output_path) != "xlsx":
+            raise ValueError("Several sheets can only be saved to an .xlsx file")
+        self.progress = progress
+        self.control = control
+        self.started = time.perf_counter()
+        self.total_rows = self.count_texts()
+        if self.checkpoint:
+            self.checkpoint.load()
+        try:
+            with ChunkWriter(self.output_path, schema=input_schema(self.input_path)) as writer:
+                pending, queued = [], 0
+                for sheet, chunk in iter_sheets(self.input_path, list(self.selection), self.chunksize):
+                    for column in self.selection[sheet]:
+                        if column not in chunk.columns:
+                            where = f"sheet '{sheet}' of {self.input_path}" if sheet is not None else self.input_path
+                            raise KeyError(f"Column '{column}' not found in {where}")
+                    pending.append((sheet, chunk))
+                    queued += len(chunk) * len(self.selection[sheet])
+                    # Small sheets are queued together, so they are batched as one
+                    if queued >= self.chunksize:
+                        self.process(writer, pending)
+                        pending, queued = [], 0
+                        if self.cancelled:
+                            break
+                if pending and not self.cancelled:
+                    self.process(writer, pending)
+
+                if self.rows_done == 0 and writer.columns is None:
+                    sheet, columns = next(iter(self.selection.items()))
+                    writer.write(pd.DataFrame(columns=read_columns(self.input_path, sheet) +
+                                              [self.summary_name(sheet, column) for column in columns]), sheet)
+        except BaseException:
+            if self.checkpoint:
+                self.checkpoint.close()
+            raise
+
+        if self.checkpoint:
+            # A cancelled job keeps its journal so it can be resumed later
+            if self.cancelled:
+                self.checkpoint.close()
+            else:
+                self.checkpoint.finish()
+        return self.rows_done
@@ -0,0 +1,319 @@
+"""Long-running local summarization service: one warm model shared by many clients.
+
+    python summary_service.py --backend bart --port 8765 --max-batch 16 --max-wait-ms 50
+    curl -s localhost:8765/summarize -d '{"texts": ["First preface...", "Second preface..."]}'
+    curl -s localhost:8765/metrics
+
+Texts from concurrent requests are queued and run through the backend together. A batch is
+sent as soon as it holds --max-batch texts, or once its oldest text has waited --max-wait-ms,
+so a lone client pays at most that wait while many small clients get batch throughput. The
+queue is bounded: a request that does not fit gets 503 with Retry-After instead of piling up.
+Summaries come from the shared summary cache when possible. Only listen on localhost unless
+the network is trusted: there is no authentication.
+
+Endpoints:
+    POST /summarize  {"texts": [...]} -> {"summaries": [...]}  (or {"text": ...} -> {"summary": ...})
+    GET  /metrics    queue depth, batch sizes, p50/p99 latency and throughput
+    GET  /health     backend and model
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from instrumentation import percentile
+
+# A short text that still needs a summary, run once at startup to load the model
+WARM_UP_TEXT = " ".join(["The library holds an early edition of this collection of letters."] * 3)
+
+
+class QueueFull(Exception):
+    """The service already holds as many texts as it will queue"""
+
+
+class MicroBatcher:
+    """Collects texts from many threads into batches for one summarize_all(texts) function.
+
+    submit() returns one Future per text. A worker thread takes up to `max_batch` texts at a
+    time, waiting at most `max_wait_ms` after the oldest one arrived for the batch to fill.
+    Latencies of the last `window` texts are kept for the metrics."""
+    def __init__(self, summarize_all, max_batch=16, max_wait_ms=20, max_queue=1024, window=10000):
+        self.summarize_all = summarize_all
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max(self.max_batch, max_queue)
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self.texts_done = 0
+        self.batches = 0
+        self.batch_seconds = 0.0
+        self.failed_batches = 0
+        self.rejected = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, texts):
+        futures = [Future() for _ in texts]
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The service is shutting down")
+            # All of a request's texts are queued, or none of them
+            if len(self.pending) + len(texts) > self.max_queue:
+                self.rejected += 1
+                raise QueueFull(f"Queue full ({len(self.pending)}/{self.max_queue} texts waiting)")
+            queued = time.perf_counter()
+            self.pending.extend((text, future, queued) for text, future in zip(texts, futures))
+            self.condition.notify()
+        return futures
+
+    def next_batch(self):
+        """Up to max_batch queued items, or None once closed and drained"""
+        with self.condition:
+            while not self.pending and not self.closed:
+                self.condition.wait()
+            if not self.pending:
+                return None
+            deadline = self.pending[0][2] + self.max_wait
+            while len(self.pending) < self.max_batch and not self.closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = [self.pending.popleft() for _ in range(min(self.max_batch, len(self.pending)))]
+            self.in_flight = len(batch)
+            return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            try:
+                summaries = self.summarize_all([text for text, _, _ in batch])
+                error = None
+            except Exception as e:
+                print(f"Error summarizing a batch of {len(batch)}: {e}", file=sys.stderr)
+                summaries, error = None, e
+            done = time.perf_counter()
+            with self.condition:
+                self.in_flight = 0
+                self.batches += 1
+                self.batch_seconds += done - start
+                if error is not None:
+                    self.failed_batches += 1
+                else:
+                    self.texts_done += len(batch)
+                    self.latencies.extend(done - queued for _, _, queued in batch)
+            for i, (_, future, _) in enumerate(batch):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(summaries[i])
+
+    def close(self):
+        """Stop accepting texts; the worker finishes what is queued and exits"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.worker.join()
+
+    def metrics(self):
+        with self.condition:
+            latencies = list(self.latencies)
+            elapsed = time.perf_counter() - self.started
+            return {
+                "queue_depth": len(self.pending),
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "texts_done": self.texts_done,
+                "batches": self.batches,
+                "failed_batches": self.failed_batches,
+                "rejected_requests": self.rejected,
+                "mean_batch_size": round(self.texts_done / max(1, self.batches - self.failed_batches), 2),
+                "mean_batch_seconds": round(self.batch_seconds / self.batches, 3) if self.batches else None,
+                "p50_latency": percentile(latencies, 0.50),
+                "p99_latency": percentile(latencies, 0.99),
+                "texts_per_second": round(self.texts_done / elapsed, 3) if elapsed else None,
+                "uptime_seconds": round(elapsed, 1),
+            }
+
+
+class SummaryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {"error": {"message": message}}, headers)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            self.send_json(200, self.server.batcher.metrics())
+        elif path == "/health":
+            self.send_json(200, {"status": "ok", "backend": self.server.backend, "model": self.server.model_name})
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/summarize":
+            self.send_error_json(404, f"Unknown path {self.path}")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            single = "text" in request
+            texts = [request["text"]] if single else request["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts must be a list of strings")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.send_error_json(400, f'Expected {{"texts": [...]}} or {{"text": "..."}}: {e}')
+            return
+
+        batcher = self.server.batcher
+        if len(texts) > batcher.max_queue:
+            self.send_error_json(413, f"At most {batcher.max_queue} texts per request")
+            return
+        try:
+            futures = batcher.submit(texts)
+        except QueueFull as e:
+            self.send_error_json(503, str(e), headers={"Retry-After": str(self.server.retry_after)})
+            return
+        except RuntimeError as e:
+            self.send_error_json(503, str(e))
+            return
+
+        deadline = time.perf_counter() + self.server.request_timeout
+        try:
+            summaries = [future.result(timeout=max(0, deadline - time.perf_counter())) for future in futures]
+        except FutureTimeout:
+            self.send_error_json(504, f"No summary within {self.server.request_timeout}s")
+            return
+        except Exception as e:
+            self.send_error_json(500, f"Summarization failed: {e}")
+            return
+        self.send_json(200, {"summary": summaries[0]} if single else {"summaries": summaries})
+
+
+class SummaryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once; the default listen backlog of 5 resets connections
+    request_queue_size = 128
+
+
+def make_server(batcher, host="127.0.0.1", port=8765, backend="", model_name="", retry_after=1,
+                request_timeout=300.0):
+    server = SummaryServer((host, port), SummaryRequestHandler)
+    server.batcher = batcher
+    server.backend = backend
+    server.model_name = model_name
+    server.retry_after = retry_after
+    server.request_timeout = request_timeout
+    return server
+
+
+def parse_args(argv=None):
+    from summarize import BACKENDS, add_engine_arguments
+    parser = argparse.ArgumentParser(description="Serve summaries over HTTP from one warm model.")
+    parser.add_argument("--backend", choices=BACKENDS, required=True,
+                        help="bart (app.py), smart (app_BART.py) or openai (app_OPENAI.py)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--min-words", type=int, help="Minimum summary length")
+    parser.add_argument("--max-words", type=int, help="Maximum summary length")
+
+    batching = parser.add_argument_group("micro-batching")
+    batching.add_argument("--max-batch", type=int, default=16, help="Most texts run through the model together")
+    batching.add_argument("--max-wait-ms", type=float, default=20,
+                          help="Longest a text waits for its batch to fill before it is sent anyway")
+    batching.add_argument("--max-queue", type=int, default=1024,
+                          help="Texts waiting before new requests get 503 (backpressure)")
+    batching.add_argument("--request-timeout", type=float, default=300, help="Seconds before a request gets 504")
+
+    add_engine_arguments(parser)
+
+    cache = parser.add_argument_group("cache")
+    cache.add_argument("--no-cache", action="store_true", help="Do not read or write the summary cache")
+    cache.add_argument("--cache-path", help="Cache database (default: ~/.cache/smart_summarizer/summaries.sqlite)")
+    cache.add_argument("--no-warm-up", action="store_true",
+                       help="bart/smart: load the model on the first request instead of at startup")
+
+    args = parser.parse_args(argv)
+    from summarize import DEFAULTS
+    for name in ("min_words", "max_words"):
+        if getattr(args, name) is None:
+            setattr(args, name, DEFAULTS[args.backend][name])
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import warnings
+    from summarize import build_backend
+    from summary_cache import SummaryCache, cache_key, needs_summary
+    warnings.filterwarnings("ignore")
+
+    cache = None if args.no_cache else SummaryCache(path=args.cache_path)
+    model_name, params, summarize_all, close = build_backend(args, cache)
+
+    def summarize_batch(texts):
+        keys = [cache_key(text, args.backend, model_name, **params) if needs_summary(text) else None
+                for text in texts]
+        if cache is not None:
+            return cache.summarize(texts, keys, summarize_all)
+        todo = [i for i, key in enumerate(keys) if key is not None]
+        summaries = [""] * len(texts)
+        for i, summary in zip(todo, summarize_all([texts[i] for i in todo]) if todo else []):
+            summaries[i] = summary
+        return summaries
+
+    # Load the model now so the first client doesn't pay for it (the OpenAI backend has none)
+    if args.backend != "openai" and not args.no_warm_up:
+        print(f"Loading the {args.backend} model...", file=sys.stderr)
+        start = time.perf_counter()
+        summarize_all([WARM_UP_TEXT])
+        print(f"Model ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    batcher = MicroBatcher(summarize_batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                           max_queue=args.max_queue)
+    server = make_server(batcher, args.host, args.port, args.backend, model_name,
+                         request_timeout=args.request_timeout)
+    print(f"Summary service ({args.backend}) listening on http://{args.host}:{server.server_address[1]}",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        close()
+        if cache is not None:
+            cache.close()
+        print(json.dumps(batcher.metrics()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from checkpoint import JobCheckpoint
+from summary_cache import cache_key
+from summary_job import SummaryJob
+
+TEXTS = [f"Preface number {i} about the letters of the author and the history of the press." for i in range(6)]
+
+
+def run_job(tmp_path, max_words, fail_after=None):
+    calls = []
+
+    def summarize_all(texts):
+        if fail_after is not None and len(calls) >= fail_after:
+            raise RuntimeError("crash")
+        calls.append(len(texts))
+        return [f"{max_words}: {text[:20]}" for text in texts]
+
+    def key_for(text):
+        return cache_key(text, "test", "model", max_words=max_words)
+
+    output = str(tmp_path / "out.csv")
+    job = SummaryJob(str(tmp_path / "in.csv"), "Preface", output, summarize_all, key_for,
+                     checkpoint=JobCheckpoint(output), batch_rows=2)
+    job.run()
+    return job, calls
+
+
+def crash_after_two_batches(tmp_path):
+    pd.DataFrame({"Preface": TEXTS}).to_csv(tmp_path / "in.csv", index=False)
+    with pytest.raises(RuntimeError):
+        run_job(tmp_path, 50, fail_after=2)
+    # Both finished batches were journaled before the crash
+    assert JobCheckpoint(str(tmp_path / "out.csv")).load() == 4
+
+
+def test_resume_reuses_finished_rows(tmp_path):
+    crash_after_two_batches(tmp_path)
+    job, calls = run_job(tmp_path, 50)
+    assert job.rows_resumed == 4 and calls == [2]
+
+
+def test_resume_with_other_settings_summarizes_again(tmp_path):
+    crash_after_two_batches(tmp_path)
+    job, calls = run_job(tmp_path, 80)
+    assert job.rows_resumed == 0 and calls == [2, 2, 2]
+    assert pd.read_csv(tmp_path / "out.csv")["Summary"].str.startswith("80:").all()
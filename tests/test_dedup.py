@@ -0,0 +1,18 @@
+from dedup import Deduplicator
+
+TEXT = ("This edition collects the letters of the author written between the two wars, "
+        "with notes on the people and places they mention and a new introduction.")
+REPRINT = TEXT.replace("a new introduction", "a revised introduction")
+
+
+def test_near_duplicate_of_failed_leader_is_summarized():
+    dedup = Deduplicator("minhash", threshold=0.5)
+    assert dedup.summarize([TEXT], ["a"], lambda texts, keys: ["[SUMMARY FAILED]"]) == ["[SUMMARY FAILED]"]
+    # The leader has no usable summary, so the matching reprint becomes the representative
+    calls = []
+    summaries = dedup.summarize([REPRINT, REPRINT + " Reprinted."], ["b", "c"],
+                                lambda texts, keys: calls.append(texts) or ["ok"] * len(texts))
+    assert calls == [[REPRINT]]
+    assert summaries == ["ok", "ok"]
+    # From now on the leader's summary is reused
+    assert dedup.summarize([TEXT + " Reprinted."], ["d"], lambda texts, keys: ["unused"]) == ["ok"]
@@ -0,0 +1,42 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from summary_job import SummaryJob
+
+TEXTS = [f"Preface {i}" for i in range(6)]
+
+
+def summarize(tmp_path, input_path):
+    output = str(tmp_path / "out.parquet")
+    job = SummaryJob(input_path, "Preface", output, lambda texts: [t.upper() for t in texts],
+                     lambda text: text, chunksize=2)
+    job.run()
+    return pq.read_table(output)
+
+
+def test_parquet_columns_typed_differently_by_later_chunks(tmp_path):
+    # Typed chunk by chunk, Volume would be integers, then floats with a blank, then strings
+    pd.DataFrame({"Preface": TEXTS, "Volume": ["1", "2", "3", "", "4", "iv"]}).to_csv(tmp_path / "in.csv", index=False)
+    table = summarize(tmp_path, str(tmp_path / "in.csv"))
+    assert table.schema.field("Volume").type == pa.string()
+    assert table.column("Volume").to_pylist() == ["1", "2", "3", None, "4", "iv"]
+    assert table.column("Summary").to_pylist() == [t.upper() for t in TEXTS]
+
+
+def test_parquet_input_keeps_its_schema(tmp_path):
+    volumes = pa.array([1, 2, 3, None, 5, 6], type=pa.int64())
+    pq.write_table(pa.table({"Preface": TEXTS, "Volume": volumes}), tmp_path / "in.parquet")
+    table = summarize(tmp_path, str(tmp_path / "in.parquet"))
+    assert table.schema.field("Volume").type == pa.int64()
+    assert table.column("Volume").to_pylist() == [1, 2, 3, None, 5, 6]
+
+
+def test_csv_values_pass_through_unchanged(tmp_path):
+    pd.DataFrame({"Preface": TEXTS, "ISBN": ["0306406152", "", "1", "2", "3", "0306406152"]}).to_csv(
+        tmp_path / "in.csv", index=False)
+    output = tmp_path / "out.csv"
+    SummaryJob(str(tmp_path / "in.csv"), "Preface", str(output), lambda texts: [t.upper() for t in texts],
+               lambda text: text, chunksize=2).run()
+    assert output.read_text(encoding="utf-8").splitlines()[1:] == [
+        "Preface 0,0306406152,PREFACE 0", "Preface 1,,PREFACE 1", "Preface 2,1,PREFACE 2",
+        "Preface 3,2,PREFACE 3", "Preface 4,3,PREFACE 4", "Preface 5,0306406152,PREFACE 5"]
@@ -0,0 +1,27 @@
+import pytest
+import mock_openai_server
+from gpt_summarizer import AsyncChatGPTSummarizer
+
+TEXTS = [f"Preface number {i} about the letters of the author and the history of the press." for i in range(5)]
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    server, base_url = mock_openai_server.start_in_thread(port=0)
+    monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    yield
+    server.shutdown()
+
+
+def test_rate_limits_and_client_last_across_calls(mock_api):
+    summarizer = AsyncChatGPTSummarizer(concurrency=4, requests_per_minute=60)
+    try:
+        assert all(summarizer.summarize_all(TEXTS))
+        client, (_, request_bucket, _) = summarizer.connect()
+        assert all(summarizer.summarize_all(TEXTS))
+        assert summarizer.connect()[0] is client
+        # Both calls drew on one bucket (it refills one request per second)
+        assert request_bucket.tokens < 60 - len(TEXTS)
+    finally:
+        summarizer.close()
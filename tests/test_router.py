@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from router import CostRouter, ExtractiveSummarizer
+
+# Ten sentences of twelve words: short enough to route, plain enough to extract
+TEXT = " ".join(f"Sentence {i} of the preface describes the letters and the press." for i in range(10))
+
+
+class FakeEncoder:
+    def encode(self, sentences, batch_size=None, normalize_embeddings=True):
+        vectors = np.random.RandomState(len(sentences)).rand(len(sentences), 8)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_route_words_must_exceed_summary_length():
+    assert CostRouter(summary_words=200).route_words == 300
+    with pytest.raises(ValueError):
+        CostRouter(summary_words=200, route_words=150)
+
+
+def test_text_shorter_than_summary_is_shortened():
+    router = CostRouter(summary_words=200)
+    assert router.is_easy(TEXT)
+    assert not router.is_easy(" ".join(["word"] * 100))
+    extractive = ExtractiveSummarizer()
+    extractive.model = FakeEncoder()
+    summary = extractive.summarize_all([TEXT], max_words=200)[0]
+    assert summary != TEXT and len(summary.split()) <= 0.8 * len(TEXT.split())
+    assert summary.endswith(".")
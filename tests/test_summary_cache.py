@@ -0,0 +1,21 @@
+import numpy as np
+from smart_summarizer import SmartSummarizer
+from summary_cache import needs_summary
+
+# Ten words but under 50 characters
+SHORT_WORDS = "a b c d e f g h i j"
+
+
+def test_needs_summary():
+    assert not needs_summary(None) and not needs_summary(np.nan)
+    assert not needs_summary("one two three four five six seven eight nine")
+    assert needs_summary(SHORT_WORDS)
+
+
+def test_smart_engine_skips_the_rows_that_get_no_cache_key():
+    summarizer = SmartSummarizer.__new__(SmartSummarizer)
+    summarizer.summarize_content = lambda content, max_length, min_length: "summary"
+    summarizer.extract_key_concepts = lambda text: []
+    summarizer.select_relevant_sentences = lambda text, concepts: text
+    assert summarizer.generate_summary(SHORT_WORDS) == "summary"
+    assert summarizer.generate_summary("too short") == ""